@@ -25,10 +25,13 @@ def create_app():
     ensure_dirs(app.config)
     setup_logging(app.config)
 
-    # --- DB schema init / migrations (prototype) ---
-    # Ensure comment table exists (run once at startup, NOT per request)
-    from repositories.comment_repo import ensure_comment_table
-    ensure_comment_table(app.config)
+    # One pooled DB connection per request (checked out on first query)
+    from repositories.db import init_app as init_db
+    init_db(app)
+
+    # --- DB schema migrations (run once at startup, NOT per request) ---
+    from repositories.migrations import migrate
+    migrate(app.config)
 
     # Blueprints
     from controllers.auth import auth_bp
@@ -0,0 +1,44 @@
+"""
+Render time of the worker plots vs. recording length.
+
+Run from flask_app_group1/:
+    python -m benchmarks.plot_render
+"""
+import os
+import time
+import tempfile
+
+import numpy as np
+
+from signal_processing.plots import save_time_plot, save_spectrum_plot
+
+FS = 360
+MINUTES = [1, 10, 60, 240]
+
+
+def _bench(fn, path, raw, filtered, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(path=path, raw=raw, filtered=filtered, fs=FS)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'minutes':>8} {'samples':>10} {'time plot [s]':>14} {'spectrum [s]':>13}")
+        for minutes in MINUTES:
+            n = minutes * 60 * FS
+            t = np.arange(n) / FS
+            raw = np.sin(2 * np.pi * 1.2 * t) + 0.1 * rng.standard_normal(n)
+            filtered = np.sin(2 * np.pi * 1.2 * t)
+
+            t_time = _bench(save_time_plot, os.path.join(tmp, "time.png"), raw, filtered)
+            t_freq = _bench(save_spectrum_plot, os.path.join(tmp, "freq.png"), raw, filtered)
+            print(f"{minutes:>8} {n:>10} {t_time:>14.3f} {t_freq:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,10 @@ class Config:
     DB_NAME = os.getenv("DB_NAME", "DUMMY_DB_NAME")
     DB_PORT = int(os.getenv("DB_PORT", "DUMMY_PORT"))
 
+    # Connection pool (per process): max open connections + wait for a free one
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))
     DATA_ROOT = os.getenv("DATA_ROOT", os.path.join(BASE_DIR, "data"))
 
@@ -17,3 +21,53 @@ class Config:
     PLOTS_DIR = os.path.join(DATA_ROOT, "plots")
 
     LOG_DIR = os.getenv("LOG_DIR", os.path.join(BASE_DIR, "logs"))
+
+    # Uploads: max size per file; resumable uploads arrive in chunks of
+    # UPLOAD_CHUNK_BYTES into UPLOAD_INCOMING_DIR and expire after the TTL
+    UPLOAD_MAX_MB = float(os.getenv("UPLOAD_MAX_MB", "1024"))
+    UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(8 * 1024 * 1024)))
+    UPLOAD_INCOMING_DIR = os.path.join(DATA_ROOT, "uploads", "incoming")
+    UPLOAD_SESSION_TTL_HOURS = float(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+    # Bulk upload (archive or multipart batch): max WFDB records / total size per request
+    UPLOAD_BULK_MAX_RECORDS = int(os.getenv("UPLOAD_BULK_MAX_RECORDS", "200"))
+    UPLOAD_BULK_MAX_MB = float(os.getenv("UPLOAD_BULK_MAX_MB", "4096"))
+    # Flask answers 413 for bigger request bodies (largest upload kind + form overhead)
+    MAX_CONTENT_LENGTH = int(max(2 * UPLOAD_MAX_MB, UPLOAD_BULK_MAX_MB) * 1024 * 1024) + 1024 * 1024
+
+    # Signal processing: powerline notch (50 Hz in EU, 60 Hz in the US)
+    ECG_NOTCH_HZ = float(os.getenv("ECG_NOTCH_HZ", "50"))
+    # Leads to process, e.g. "0,1,6" (default: all leads in the record)
+    ECG_CHANNELS = [int(c) for c in os.getenv("ECG_CHANNELS", "").split(",") if c.strip()] or None
+    # Recordings are processed in chunks of this length (bounds worker memory),
+    # each filtered with extra overlap on both sides to hide edge transients
+    PROCESSING_CHUNK_SECONDS = float(os.getenv("PROCESSING_CHUNK_SECONDS", "300"))
+    PROCESSING_OVERLAP_SECONDS = float(os.getenv("PROCESSING_OVERLAP_SECONDS", "10"))
+
+    # Plots are rendered on first view into PLOTS_DIR, which is kept under this size (LRU)
+    PLOT_CACHE_MAX_MB = float(os.getenv("PLOT_CACHE_MAX_MB", "500"))
+    # Time span (from the start of the recording) shown in the rendered plots
+    PLOT_WINDOW_SECONDS = float(os.getenv("PLOT_WINDOW_SECONDS", "300"))
+    # Browser caching of plots with a versioned URL (private: patient data)
+    PLOT_HTTP_MAX_AGE_SECONDS = int(os.getenv("PLOT_HTTP_MAX_AGE_SECONDS", str(365 * 24 * 3600)))
+    # Listing thumbnails, made by the worker: seconds of lead 0 shown, and a WebP copy
+    PLOT_THUMB_SECONDS = float(os.getenv("PLOT_THUMB_SECONDS", "10"))
+    PLOT_THUMB_WEBP = os.getenv("PLOT_THUMB_WEBP", "1") == "1"
+
+    # Repository read-through cache (users/patients), per process; 0 disables it
+    REPO_CACHE_TTL_SECONDS = float(os.getenv("REPO_CACHE_TTL_SECONDS", "60"))
+    REPO_CACHE_MAX_ENTRIES = int(os.getenv("REPO_CACHE_MAX_ENTRIES", "1024"))
+
+    # Clinician signal API: longest window one request may read
+    SIGNAL_WINDOW_MAX_SECONDS = float(os.getenv("SIGNAL_WINDOW_MAX_SECONDS", "300"))
+
+    # Worker: how many queued recordings one worker claims per round trip
+    WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "1"))
+    # Supervisor mode: number of worker processes (override with --workers)
+    WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+    # A recording that kills its worker this many times is marked FAILED
+    WORKER_MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "3"))
+    # Uploads wake idle workers through this local socket ("" disables it)
+    WORKER_WAKEUP_SOCKET = os.getenv("WORKER_WAKEUP_SOCKET", os.path.join(DATA_ROOT, "run", "worker.sock"))
+    # Idle DB polling backoff (safety net / fallback when the socket is unavailable)
+    WORKER_POLL_MIN_SECONDS = float(os.getenv("WORKER_POLL_MIN_SECONDS", "0.5"))
+    WORKER_POLL_MAX_SECONDS = float(os.getenv("WORKER_POLL_MAX_SECONDS", "30"))
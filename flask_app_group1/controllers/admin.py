@@ -8,15 +8,33 @@ from flask import (
     send_from_directory,
     redirect,
     url_for,
+    jsonify,
+    Response,
+    stream_with_context,
 )
 from services.auth_service import require_role
 from repositories.user_repo import list_users, create_user, reset_password
 from repositories.patient_repo import ensure_patient_for_user
+from repositories.cache import cache_stats
+from infrastructure.log_reader import (
+    is_log_name,
+    log_chain,
+    list_logs,
+    tail_lines,
+    read_range,
+    compile_filter,
+    grep_lines,
+)
 
 admin_bp = Blueprint("admin", __name__)
 
 ALLOWED_ROLES = {"patient", "clinician", "admin", "technician"}
 
+# Log viewer limits (per request)
+MAX_TAIL_LINES = 5000
+MAX_RANGE_BYTES = 1024 * 1024
+MAX_GREP_MATCHES = 10000
+
 
 # -----------------------
 # User list
@@ -82,37 +100,93 @@ def users_reset(user_id):
 @admin_bp.get("/logs")
 @require_role("admin", "technician")
 def logs():
-    return render_template("admin/logs.html")
+    return render_template("admin/logs.html", files=list_logs(current_app.config["LOG_DIR"]))
 
 
 # -----------------------
-# Serve log file
+# Serve / view log file
 # -----------------------
+def _log_text(body, headers=None):
+    resp = Response(body, mimetype="text/plain")
+    resp.headers["Cache-Control"] = "no-store"
+    for k, v in (headers or {}).items():
+        resp.headers[k] = str(v)
+    return resp
+
+
 @admin_bp.get("/logs/file/<path:filename>")
 @require_role("admin", "technician")
 def logs_file(filename):
     """
     Serve log files to admin/technician.
-    Basic security: prevent traversal and only allow common log-like extensions.
+    Basic security: prevent traversal and only allow log-like names (incl. rotations, app.log.1).
+
+    Without parameters the file is downloaded. Viewer modes (text/plain):
+    - ?tail=N                    last N lines, read backwards from EOF (continues into rotations)
+    - ?offset=B&length=L         whole lines from byte B; X-Log-Next-Offset / X-Log-Size headers
+    - ?grep=text[&regex=1][&case=1]  matching lines of the file and all its rotations, streamed
     """
     if ".." in filename or filename.startswith(("/", "\\")):
         abort(400)
 
-    if not (filename.lower().endswith(".log") or filename.lower().endswith(".txt")):
+    if not is_log_name(filename):
         abort(404)
 
     log_dir = current_app.config["LOG_DIR"]
+    paths = log_chain(log_dir, filename)
+    if not paths:
+        abort(404)
+
+    if "grep" in request.args:
+        if not request.args["grep"]:
+            abort(400, description="Empty search")
+        try:
+            matcher = compile_filter(
+                request.args["grep"],
+                regex=request.args.get("regex") == "1",
+                ignore_case=request.args.get("case") != "1",
+            )
+        except ValueError as e:
+            abort(400, description=str(e))
+        return _log_text(stream_with_context(grep_lines(paths, matcher, MAX_GREP_MATCHES)))
+
+    if "tail" in request.args:
+        n = request.args.get("tail", type=int)
+        if not n or n < 1:
+            abort(400, description="tail must be a positive number of lines")
+        lines = tail_lines(paths, min(n, MAX_TAIL_LINES))
+        return _log_text("".join(line + "\n" for line in lines))
+
     full_path = os.path.join(log_dir, filename)
     if not os.path.isfile(full_path):
         abort(404)
 
+    if "offset" in request.args or "length" in request.args:
+        offset = request.args.get("offset", 0, type=int)
+        length = request.args.get("length", 64 * 1024, type=int)
+        if offset < 0 or length < 1:
+            abort(400, description="offset must be >= 0 and length > 0")
+        page = read_range(full_path, offset, min(length, MAX_RANGE_BYTES))
+        return _log_text(page["text"], {
+            "X-Log-Offset": page["offset"],
+            "X-Log-Next-Offset": "" if page["next_offset"] is None else page["next_offset"],
+            "X-Log-Size": page["size"],
+        })
+
     return send_from_directory(log_dir, filename)
 
 
 # -----------------------
-# DB page (placeholder)
+# DB page (placeholder + repository cache counters)
 # -----------------------
 @admin_bp.get("/db")
 @require_role("admin", "technician")
 def db_page():
-    return render_template("admin/db.html")
+    return render_template("admin/db.html", caches=cache_stats())
+
+
+@admin_bp.get("/cache")
+@require_role("admin", "technician")
+def cache_json():
+    """Hit/miss counters of this process' repository caches."""
+    return jsonify(cache_stats())
@@ -1,20 +1,175 @@
 import os
-from flask import Blueprint, render_template, request, session, current_app, send_from_directory, abort
+import math
+from datetime import datetime, timedelta
+import numpy as np
+from flask import Blueprint, render_template, request, session, current_app, send_from_directory, abort, jsonify, Response, url_for
 from services.auth_service import require_role
-from repositories.patient_repo import list_patients, get_patient_by_id
-from repositories.recording_repo import list_recent_recordings, get_recording
+from infrastructure.storage import read_recording_meta
+from repositories.patient_repo import list_patients_page, get_patient_by_id
+from repositories.recording_repo import list_recordings_page, get_recording
 from repositories.comment_repo import add_comment, list_comments
+from repositories.feature_repo import FLAG_TYPES, list_flagged_recordings
+from repositories.search_repo import search_recordings
+from services.plot_service import parse_plot_name, ensure_plot, plot_version, plot_etag, thumbnail_path
+from services.signal_service import (
+    read_signal_window,
+    read_envelope_window,
+    encode_samples,
+    SignalNotAvailable,
+)
 
 clinician_bp = Blueprint("clinician", __name__)
 
 
+RECORDING_STATUSES = ("QUEUED", "PROCESSING", "DONE", "FAILED")
+
+
+def _date_arg(name: str):
+    value = request.args.get(name) or None
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        abort(400, description=f"Invalid date in {name}")
+
+
+def _thumb_versions(cfg, recs) -> dict:
+    """recording_id -> plot version, for the cache-busting ?v= of listing thumbnails."""
+    versions = {}
+    for r in recs:
+        if r.get("status") == "DONE":
+            version = plot_version(read_recording_meta(cfg, r["recording_id"]))
+            if version:
+                versions[r["recording_id"]] = version
+    return versions
+
+
+def _require_finite(*values):
+    # float() accepts "nan" and "inf"; neither is a position in a recording
+    if not all(v is None or math.isfinite(v) for v in values):
+        abort(400, description="start and duration must be finite numbers")
+
+
+def _page_urls(endpoint: str, next_cursor):
+    """(first page, next page) URLs with the current filters; None where there is no such page."""
+    args = {k: v for k, v in request.args.items() if k != "after" and v}
+    first_url = url_for(endpoint, **args) if request.args.get("after") else None
+    next_url = url_for(endpoint, after=next_cursor, **args) if next_cursor else None
+    return first_url, next_url
+
+
 @clinician_bp.get("/")
 @require_role("clinician")
 def dashboard():
     cfg = current_app.config
-    recs = list_recent_recordings(cfg, limit=50)
-    patients = list_patients(cfg)
-    return render_template("clinician/search_record.html", recs=recs, patients=patients)
+
+    # Triage filter, e.g. ?flag=sudden_hr_change&days=7 (index lookup on ecg_feature)
+    flag = request.args.get("flag") or None
+    if flag and flag not in FLAG_TYPES:
+        abort(400, description="Unknown flag")
+    days = request.args.get("days", type=int)
+
+    # Listing filters, e.g. ?status=FAILED&q=<patient id>&from=2026-01-01&to=2026-02-01
+    status = request.args.get("status") or None
+    if status and status not in RECORDING_STATUSES:
+        abort(400, description="Unknown status")
+    patient_id = request.args.get("q", type=int)
+    date_from = _date_arg("from")
+    date_to = _date_arg("to")
+    if date_to:
+        date_to += timedelta(days=1)  # "to" is inclusive
+
+    filters = dict(
+        status=status,
+        patient_id=patient_id,
+        date_from=date_from,
+        date_to=date_to,
+        after=request.args.get("after") or None,
+        limit=50,
+    )
+    try:
+        if flag:
+            recs, next_cursor = list_flagged_recordings(cfg, flag, days=days, **filters)
+        else:
+            recs, next_cursor = list_recordings_page(cfg, **filters)
+    except ValueError:
+        abort(400, description="Invalid page cursor")
+
+    first_url, next_url = _page_urls("clinician.dashboard", next_cursor)
+
+    return render_template(
+        "clinician/search_record.html",
+        active_page="dashboard",
+        recs=recs,
+        thumb_versions=_thumb_versions(cfg, recs),
+        first_url=first_url,
+        next_url=next_url,
+        flag_types=FLAG_TYPES,
+        statuses=RECORDING_STATUSES,
+    )
+
+
+@clinician_bp.get("/patients")
+@require_role("clinician")
+def patients():
+    cfg = current_app.config
+
+    # ?order=name&name=han -> patients named Han..., alphabetically
+    order = request.args.get("order") or "id"
+    if order not in ("id", "name"):
+        abort(400, description="Unknown order")
+    name_prefix = (request.args.get("name") or "").strip() or None
+
+    try:
+        rows, next_cursor = list_patients_page(
+            cfg,
+            order=order,
+            name_prefix=name_prefix,
+            after=request.args.get("after") or None,
+            limit=50,
+        )
+    except ValueError:
+        abort(400, description="Invalid page cursor")
+
+    first_url, next_url = _page_urls("clinician.patients", next_cursor)
+
+    return render_template(
+        "clinician/patients.html",
+        active_page="patients",
+        patients=rows,
+        first_url=first_url,
+        next_url=next_url,
+    )
+
+
+@clinician_bp.get("/search")
+@require_role("clinician")
+def search():
+    """Full-text search over patient names and clinician comments, e.g. ?q=AF suspected"""
+    cfg = current_app.config
+    query = (request.args.get("q") or "").strip()
+
+    try:
+        recs, next_cursor = search_recordings(
+            cfg,
+            query,
+            after=request.args.get("after") or None,
+            limit=50,
+        )
+    except ValueError:
+        abort(400, description="Invalid page cursor")
+
+    first_url, next_url = _page_urls("clinician.search", next_cursor)
+    return render_template(
+        "clinician/search.html",
+        active_page="search",
+        query=query,
+        recs=recs,
+        thumb_versions=_thumb_versions(cfg, recs),
+        first_url=first_url,
+        next_url=next_url,
+    )
 
 
 @clinician_bp.route("/record/<int:recording_id>", methods=["GET", "POST"])
@@ -34,12 +189,35 @@ def medical_record(recording_id):
 
     comments = list_comments(cfg, recording_id)
 
-    # Build plot URLs (served through the /plots route below)
+    # Build plot URLs (served through the /plots route below), one pair per lead.
     # Using relative URLs keeps it safe behind proxy/prefix.
-    time_plot_filename = f"{recording_id}_time.png"
-    freq_plot_filename = f"{recording_id}_freq.png"
-    time_plot_url = f"/clinician/plots/{time_plot_filename}"
-    freq_plot_url = f"/clinician/plots/{freq_plot_filename}"
+    meta = read_recording_meta(cfg, recording_id)
+    viewer = None
+    if meta:
+        viewer = {
+            "leads": meta.get("leads", []),
+            "duration": meta["n_samples"] / meta["fs"],
+            "url": f"/clinician/record/{recording_id}/waveform",
+        }
+
+        # ?v= changes with every re-render, so the browser may cache these URLs for good
+        version = plot_version(meta)
+        v = f"?v={version}" if version else ""
+        plots = [
+            {
+                "lead": lead,
+                "time_url": f"/clinician/plots/{recording_id}/time_lead{i}.png{v}",
+                "freq_url": f"/clinician/plots/{recording_id}/freq_lead{i}.png{v}",
+            }
+            for i, lead in enumerate(meta.get("leads", []))
+        ]
+    else:
+        # Recordings processed before multi-lead support (lead 0 only)
+        plots = [{
+            "lead": None,
+            "time_url": f"/clinician/plots/{recording_id}_time.png",
+            "freq_url": f"/clinician/plots/{recording_id}_freq.png",
+        }]
 
     patient = get_patient_by_id(cfg, rec["patient_id"])
 
@@ -47,12 +225,48 @@ def medical_record(recording_id):
         "clinician/medicalrecord.html",
         rec=rec,
         patient=patient,
-        time_plot_url=time_plot_url,
-        freq_plot_url=freq_plot_url,
+        plots=plots,
+        viewer=viewer,
         comments=comments,
     )
 
 
+# -----------------------
+# Plot images (HTTP caching)
+# -----------------------
+# Strong ETag = recording id + pipeline version + render id (+ file name).
+# Versioned URLs (?v=<current version>) are cached privately for
+# PLOT_HTTP_MAX_AGE_SECONDS; anything else is revalidated every time, which
+# is a cheap 304 when the image has not changed.
+
+def _set_plot_cache_control(resp, versioned: bool):
+    cc = resp.cache_control
+    cc.public = None
+    cc.private = True  # patient data: never in shared caches
+    if versioned:
+        cc.no_cache = None
+        cc.max_age = current_app.config.get("PLOT_HTTP_MAX_AGE_SECONDS", 365 * 24 * 3600)
+        cc.immutable = True
+    else:
+        cc.no_cache = True
+    return resp
+
+
+def _not_modified(etag, versioned: bool):
+    """304 response if the client already has `etag`, else None (checked before any render/disk I/O)."""
+    if not etag or not request.if_none_match.contains_weak(etag):
+        return None
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    return _set_plot_cache_control(resp, versioned)
+
+
+def _send_plot_file(directory: str, filename: str, etag, versioned: bool):
+    # etag=True: werkzeug's mtime/size ETag for files without a plot version
+    resp = send_from_directory(directory, filename, etag=etag or True, conditional=True)
+    return _set_plot_cache_control(resp, versioned)
+
+
 @clinician_bp.get("/plots/<path:filename>")
 @require_role("clinician")
 def plots(filename):
@@ -69,10 +283,182 @@ def plots(filename):
     if not filename.lower().endswith(".png"):
         abort(404)
 
-    plots_dir = current_app.config["PLOTS_DIR"]
-    full_path = os.path.join(plots_dir, filename)
+    cfg = current_app.config
+    plots_dir = cfg["PLOTS_DIR"]
 
+    # Per-lead plots are rendered on first request (and cached, LRU-evicted)
+    etag, versioned = None, False
+    parsed = parse_plot_name(filename)
+    if parsed:
+        recording_id, kind, lead_index = parsed
+        version = plot_version(read_recording_meta(cfg, recording_id))
+        if version:
+            etag = plot_etag(recording_id, version, f"{kind}_lead{lead_index}.png")
+            versioned = request.args.get("v") == version
+            not_modified = _not_modified(etag, versioned)
+            if not_modified is not None:
+                return not_modified
+
+        try:
+            ensure_plot(cfg, *parsed)
+        except (FileNotFoundError, SignalNotAvailable):
+            abort(404)
+
+    full_path = os.path.join(plots_dir, filename)
     if not os.path.isfile(full_path):
         abort(404)
 
-    return send_from_directory(plots_dir, filename)
+    return _send_plot_file(plots_dir, filename, etag, versioned)
+
+
+@clinician_bp.get("/record/<int:recording_id>/thumbnail")
+@require_role("clinician")
+def thumbnail(recording_id):
+    """Listing preview made by the worker; WebP when the browser accepts it and one exists."""
+    cfg = current_app.config
+    meta = read_recording_meta(cfg, recording_id)
+
+    path = None
+    if "image/webp" in request.headers.get("Accept", ""):
+        path = thumbnail_path(cfg, recording_id, meta, "webp")
+    path = path or thumbnail_path(cfg, recording_id, meta, "png")
+    if not path:
+        abort(404)
+
+    version = plot_version(meta)
+    etag = plot_etag(recording_id, version, os.path.basename(path)) if version else None
+    versioned = bool(version) and request.args.get("v") == version
+
+    resp = _not_modified(etag, versioned)
+    if resp is None:
+        resp = _send_plot_file(os.path.dirname(path), os.path.basename(path), etag, versioned)
+    resp.vary.add("Accept")
+    return resp
+
+
+@clinician_bp.get("/record/<int:recording_id>/signal")
+@require_role("clinician")
+def signal_window(recording_id):
+    """
+    Time window of the filtered signal as JSON.
+
+    Query: start (s, default 0), duration (s, default 10), lead (index or name, default 0).
+    The .npy is memory-mapped, so only the requested samples are read from disk.
+    """
+    try:
+        start = float(request.args.get("start", 0))
+        duration = float(request.args.get("duration", 10))
+    except ValueError:
+        abort(400, description="start and duration must be numbers")
+    _require_finite(start, duration)
+
+    try:
+        window = read_signal_window(
+            current_app.config,
+            recording_id,
+            start,
+            duration,
+            lead=request.args.get("lead"),
+        )
+    except SignalNotAvailable:
+        abort(404)
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    window["samples"] = window["samples"].tolist()
+    return jsonify(window)
+
+
+@clinician_bp.get("/record/<int:recording_id>/envelope")
+@require_role("clinician")
+def signal_envelope(recording_id):
+    """
+    Min/max envelope for zoomable viewing, about one bin per screen pixel.
+
+    Query: start (s, default 0), duration (s, default whole recording),
+    lead (index or name, default 0), pixels (default 1000).
+    """
+    try:
+        start = float(request.args.get("start", 0))
+        duration = request.args.get("duration")
+        duration = float(duration) if duration else None
+        pixels = int(request.args.get("pixels", 1000))
+    except ValueError:
+        abort(400, description="start, duration and pixels must be numbers")
+    _require_finite(start, duration)
+
+    try:
+        env = read_envelope_window(
+            current_app.config,
+            recording_id,
+            start,
+            duration,
+            lead=request.args.get("lead"),
+            pixels=pixels,
+        )
+    except SignalNotAvailable:
+        abort(404)
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    env["min"] = env["min"].tolist()
+    env["max"] = env["max"].tolist()
+    return jsonify(env)
+
+
+@clinician_bp.get("/record/<int:recording_id>/waveform")
+@require_role("clinician")
+def waveform(recording_id):
+    """
+    Filtered samples for a time range as compact binary (for the in-browser viewer).
+
+    Query: start, duration (s, default whole recording), lead,
+    format=int16|float32 (default int16), points (max values, default 2000).
+    If the range has more samples than `points`, the server sends the min/max
+    envelope instead (pairs min0, max0, min1, max1, ...).
+
+    Body: little-endian int16/float32 values; value = sample * X-Scale.
+    Headers: X-Format, X-Scale, X-Start, X-Step (s between values or pairs),
+    X-Envelope (1 = min/max pairs), X-Lead, X-Sample-Rate.
+    """
+    try:
+        start = float(request.args.get("start", 0))
+        duration = request.args.get("duration")
+        duration = float(duration) if duration else None
+        points = int(request.args.get("points", 2000))
+    except ValueError:
+        abort(400, description="start, duration and points must be numbers")
+    _require_finite(start, duration)
+
+    fmt = request.args.get("format", "int16")
+    try:
+        env = read_envelope_window(
+            current_app.config,
+            recording_id,
+            start,
+            duration,
+            lead=request.args.get("lead"),
+            pixels=max(1, points // 2),
+        )
+        is_envelope = env["level"] > 0
+        if is_envelope:
+            values = np.empty(2 * env["min"].size, dtype=np.float32)
+            values[0::2] = env["min"]
+            values[1::2] = env["max"]
+        else:
+            values = env["min"]
+        payload, scale = encode_samples(values, fmt)
+    except SignalNotAvailable:
+        abort(404)
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    resp = Response(payload, mimetype="application/octet-stream")
+    resp.headers["X-Format"] = fmt
+    resp.headers["X-Scale"] = repr(scale)
+    resp.headers["X-Start"] = repr(env["start"])
+    resp.headers["X-Step"] = repr(env["bin_seconds"])
+    resp.headers["X-Envelope"] = "1" if is_envelope else "0"
+    resp.headers["X-Lead"] = env["lead"]
+    resp.headers["X-Sample-Rate"] = repr(env["fs"])
+    return resp
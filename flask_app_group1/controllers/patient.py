@@ -1,6 +1,17 @@
-from flask import Blueprint, render_template, request, session, current_app
+import tarfile
+import zipfile
+from flask import Blueprint, render_template, request, session, current_app, jsonify, abort
 from services.auth_service import require_role
-from services.upload_service import handle_patient_upload
+from services.upload_service import (
+    handle_patient_upload,
+    handle_bulk_upload,
+    start_upload_session,
+    get_upload_status,
+    write_upload_chunk,
+    complete_upload_session,
+    UploadNotFound,
+    UploadOffsetMismatch,
+)
 from repositories.patient_repo import (
     get_patient_by_user_id,
     update_patient_by_user_id,
@@ -93,6 +104,7 @@ def medicalrecord():
             patient_name="Unknown",
             patient_id="Unknown",
             recs=[],
+            next_cursor=None,
             comments_by_recording={},
         )
 
@@ -101,7 +113,12 @@ def medicalrecord():
 
     # --- Uploads ---
     from repositories.recording_repo import list_recordings_for_patient
-    recs = list_recordings_for_patient(cfg, patient_id, limit=50)
+    try:
+        recs, next_cursor = list_recordings_for_patient(
+            cfg, patient_id, limit=50, after=request.args.get("after") or None
+        )
+    except ValueError:
+        abort(400, description="Invalid page cursor")
 
     # --- Comments ---
     recording_ids = [r["recording_id"] for r in recs]
@@ -120,6 +137,7 @@ def medicalrecord():
         patient_name=patient_name,
         patient_id=patient_id,
         recs=recs,
+        next_cursor=next_cursor,
         comments_by_recording=comments_by_recording,
     )
 
@@ -173,3 +191,103 @@ def upload():
         upload_ok=True,
         recording_id=recording_id,
     )
+
+
+# -----------------------
+# Resumable upload (JSON API, used by the dashboard's uploader)
+# -----------------------
+# POST /upload/sessions                  {"dat": {"name","size","sha256"?}, "hea": {...}}
+# GET  /upload/sessions/<id>             -> bytes received per file (resume point)
+# PUT  /upload/sessions/<id>/<dat|hea>   body = next chunk, header Upload-Offset
+# POST /upload/sessions/<id>/complete    -> recording_id (queued only now)
+
+def _upload_error(e, status=400):
+    return jsonify({"error": str(e)}), status
+
+
+@patient_bp.post("/upload/sessions")
+@require_role("patient")
+def upload_session_start():
+    body = request.get_json(silent=True) or {}
+    try:
+        status = start_upload_session(current_app.config, session["user_id"], body)
+    except (ValueError, RuntimeError) as e:
+        return _upload_error(e)
+    return jsonify(status), 201
+
+
+@patient_bp.get("/upload/sessions/<upload_id>")
+@require_role("patient")
+def upload_session_status(upload_id):
+    try:
+        return jsonify(get_upload_status(current_app.config, session["user_id"], upload_id))
+    except UploadNotFound as e:
+        return _upload_error(e, 404)
+
+
+@patient_bp.put("/upload/sessions/<upload_id>/<kind>")
+@require_role("patient")
+def upload_session_chunk(upload_id, kind):
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return _upload_error("Missing Upload-Offset header")
+
+    try:
+        status = write_upload_chunk(
+            current_app.config,
+            session["user_id"],
+            upload_id,
+            kind,
+            offset,
+            request.stream,
+            request.content_length,
+        )
+    except UploadNotFound as e:
+        return _upload_error(e, 404)
+    except UploadOffsetMismatch as e:
+        # Client resumes from here
+        return jsonify({"error": str(e), "received": e.received}), 409
+    except ValueError as e:
+        return _upload_error(e)
+    return jsonify(status)
+
+
+@patient_bp.post("/upload/sessions/<upload_id>/complete")
+@require_role("patient")
+def upload_session_complete(upload_id):
+    try:
+        recording_id = complete_upload_session(current_app.config, session["user_id"], upload_id)
+    except UploadNotFound as e:
+        return _upload_error(e, 404)
+    except (ValueError, RuntimeError) as e:
+        return _upload_error(e)
+    except Exception as e:
+        current_app.logger.exception("Patient upload failed")
+        return _upload_error(e, 500)
+    return jsonify({"recording_id": recording_id})
+
+
+# -----------------------
+# Bulk upload (JSON API)
+# -----------------------
+@patient_bp.post("/upload/bulk")
+@require_role("patient")
+def upload_bulk():
+    """
+    Many WFDB records at once: form field "archive" (.zip / .tar.gz) or any
+    number of "files" fields with .dat/.hea files (paired by file name).
+    """
+    archive = request.files.get("archive")
+    files = request.files.getlist("files")
+    if not archive and not files:
+        return _upload_error("Send an archive or files")
+
+    try:
+        result = handle_bulk_upload(current_app.config, session["user_id"], archive=archive, files=files)
+    except (ValueError, RuntimeError, zipfile.BadZipFile, tarfile.TarError) as e:
+        return _upload_error(e)
+    except Exception as e:
+        current_app.logger.exception("Bulk upload failed")
+        return _upload_error(e, 500)
+    return jsonify(result), 201
@@ -0,0 +1,146 @@
+import os
+import re
+
+# --------------------------
+# Log viewer helpers (admin)
+# --------------------------
+# Everything reads the files in fixed-size blocks or line by line, so memory
+# use does not depend on the log size: tail keeps at most N lines, a range
+# read at most `length` bytes, and grep holds one line at a time.
+
+BLOCK_SIZE = 64 * 1024
+
+# app.log, worker.log, app.log.1 (RotatingFileHandler backups), notes.txt
+LOG_NAME_RE = re.compile(r"^[\w.-]+\.(log|txt)(\.\d+)?$")
+
+
+def is_log_name(filename: str) -> bool:
+    return bool(LOG_NAME_RE.match(filename)) and ".." not in filename
+
+
+def log_chain(log_dir: str, filename: str) -> list[str]:
+    """
+    The file plus its rotations that exist, oldest first:
+    app.log -> [app.log.3, app.log.2, app.log.1, app.log].
+    A rotated name (app.log.2) is only itself.
+    """
+    path = os.path.join(log_dir, filename)
+    if re.search(r"\.\d+$", filename):
+        return [path] if os.path.isfile(path) else []
+
+    rotated = []
+    i = 1
+    while os.path.isfile(f"{path}.{i}"):
+        rotated.append(f"{path}.{i}")
+        i += 1
+    chain = rotated[::-1]
+    if os.path.isfile(path):
+        chain.append(path)
+    return chain
+
+
+def list_logs(log_dir: str) -> list[dict]:
+    """Log files in log_dir (name, size), for the viewer's file list."""
+    try:
+        names = sorted(n for n in os.listdir(log_dir) if is_log_name(n))
+    except OSError:
+        return []
+    out = []
+    for name in names:
+        try:
+            out.append({"name": name, "size": os.path.getsize(os.path.join(log_dir, name))})
+        except OSError:
+            pass
+    return out
+
+
+def _reverse_lines(path: str, block_size: int = BLOCK_SIZE):
+    """Lines of a file (bytes, without newline), last line first, read backwards from EOF."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        rest = b""
+        first = True
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + rest
+            lines = buf.split(b"\n")
+            rest = lines.pop(0)  # may continue in the previous block
+            if first:
+                first = False
+                if lines and lines[-1] == b"":
+                    lines.pop()  # trailing newline at EOF
+            for line in reversed(lines):
+                yield line
+        if not first:
+            yield rest  # first line of the file
+
+
+def tail_lines(paths: list[str], n: int) -> list[str]:
+    """Last `n` lines over `paths` (oldest file first), continuing into older rotations."""
+    out = []
+    for path in reversed(paths):
+        for line in _reverse_lines(path):
+            out.append(line.decode("utf-8", errors="replace"))
+            if len(out) >= n:
+                return out[::-1]
+    return out[::-1]
+
+
+def read_range(path: str, offset: int, length: int) -> dict:
+    """
+    At most `length` bytes from `offset`, cut to whole lines: a partial first
+    line is skipped and a partial last one left for the next page (unless a
+    single line is longer than `length`).
+    Returns {"text", "offset", "next_offset", "size"}; next_offset is None at EOF.
+    """
+    size = os.path.getsize(path)
+    offset = max(0, min(offset, size))
+    with open(path, "rb") as f:
+        if offset > 0:
+            f.seek(offset - 1)
+            if f.read(1) != b"\n":
+                f.readline(length)  # rest of the line that started on the previous page
+                offset = f.tell()
+        data = f.read(length)
+
+    end = offset + len(data)
+    if end < size:
+        cut = data.rfind(b"\n")
+        if cut >= 0:
+            data = data[:cut + 1]
+            end = offset + len(data)
+
+    return {
+        "text": data.decode("utf-8", errors="replace"),
+        "offset": offset,
+        "next_offset": end if end < size else None,
+        "size": size,
+    }
+
+
+def compile_filter(pattern: str, regex: bool = False, ignore_case: bool = True):
+    """Raises ValueError for an invalid regular expression."""
+    flags = re.IGNORECASE if ignore_case else 0
+    try:
+        return re.compile(pattern if regex else re.escape(pattern), flags)
+    except re.error as e:
+        raise ValueError(f"Invalid pattern: {e}") from e
+
+
+def grep_lines(paths: list[str], matcher, max_matches: int):
+    """Yields "<file>: <line>" for matching lines, oldest file first, streaming."""
+    found = 0
+    for path in paths:
+        name = os.path.basename(path)
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if matcher.search(line):
+                    text = line.rstrip("\n")
+                    yield f"{name}: {text}\n"
+                    found += 1
+                    if found >= max_matches:
+                        yield f"-- stopped after {max_matches} matches --\n"
+                        return
@@ -1,4 +1,7 @@
 import os
+import json
+import shutil
+import hashlib
 
 
 def _cfg_get(cfg, key):
@@ -10,6 +13,7 @@ def ensure_dirs(cfg):
     os.makedirs(_cfg_get(cfg, "FILTERED_DIR"), exist_ok=True)
     os.makedirs(_cfg_get(cfg, "PLOTS_DIR"), exist_ok=True)
     os.makedirs(_cfg_get(cfg, "LOG_DIR"), exist_ok=True)
+    os.makedirs(_cfg_get(cfg, "UPLOAD_INCOMING_DIR"), exist_ok=True)
 
 
 def recording_raw_dir(cfg, recording_id: int) -> str:
@@ -17,3 +21,138 @@ def recording_raw_dir(cfg, recording_id: int) -> str:
     path = os.path.join(base, str(recording_id))
     os.makedirs(path, exist_ok=True)
     return path
+
+
+def recording_filtered_path(cfg, recording_id: int) -> str:
+    # Filtered signal, shape (n_leads, n_samples)
+    return os.path.join(_cfg_get(cfg, "FILTERED_DIR"), f"{recording_id}.npy")
+
+
+def recording_meta_path(cfg, recording_id: int) -> str:
+    # Sidecar with fs / lead names / length of the filtered signal
+    return os.path.join(_cfg_get(cfg, "FILTERED_DIR"), f"{recording_id}.json")
+
+
+def recording_envelope_dir(cfg, recording_id: int) -> str:
+    # Min/max envelope pyramid (level1.npy, level2.npy, ...) of the filtered signal
+    return os.path.join(_cfg_get(cfg, "FILTERED_DIR"), f"{recording_id}_envelope")
+
+
+def recording_plots_dir(cfg, recording_id: int) -> str:
+    # Created by the plot renderer, not on lookup
+    return os.path.join(_cfg_get(cfg, "PLOTS_DIR"), str(recording_id))
+
+
+def write_recording_meta(cfg, recording_id: int, meta: dict):
+    path = recording_meta_path(cfg, recording_id)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+
+def read_recording_meta(cfg, recording_id: int):
+    try:
+        with open(recording_meta_path(cfg, recording_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def recording_stage_dir(cfg, recording_id: int, pipeline_version: str) -> str:
+    # Memoized pipeline stage outputs (<stage>.json + arrays), one dir per pipeline version
+    return os.path.join(_cfg_get(cfg, "FILTERED_DIR"), f"{recording_id}_stages", pipeline_version)
+
+
+# --------------------------
+# Content-addressed raw files (dedup of re-uploads)
+# --------------------------
+
+def content_object_path(cfg, digest: str) -> str:
+    # RAW_DIR/.objects/ab/abcdef... (sha256 of the file content)
+    return os.path.join(_cfg_get(cfg, "RAW_DIR"), ".objects", digest[:2], digest)
+
+
+def save_stream_hashed(stream, path: str, chunk_size: int = 1 << 20, max_bytes: int | None = None) -> str:
+    """
+    Copies a file-like object to `path` in chunks, returning the sha256 of what was written.
+    Raises ValueError (and removes the partial file) once more than `max_bytes` arrive.
+    """
+    h = hashlib.sha256()
+    written = 0
+    with open(path, "wb") as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            written += len(chunk)
+            if max_bytes is not None and written > max_bytes:
+                f.close()
+                os.remove(path)
+                raise ValueError(f"File too large (max {max_bytes // (1024 * 1024)} MB)")
+            h.update(chunk)
+            f.write(chunk)
+    return h.hexdigest()
+
+
+def link_or_copy(src: str, dst: str):
+    # Hard link (no extra disk space); copy if the filesystem can't link
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def store_content(cfg, tmp_path: str, digest: str, dst_path: str):
+    """
+    Moves a freshly written file into the content store (or drops it if that
+    content is already stored) and links it to `dst_path`.
+    """
+    obj = content_object_path(cfg, digest)
+    os.makedirs(os.path.dirname(obj), exist_ok=True)
+    if os.path.exists(obj):
+        os.remove(tmp_path)
+    else:
+        shutil.move(tmp_path, obj)  # a rename unless tmp_path is on another filesystem
+    link_or_copy(obj, dst_path)
+
+
+def link_recording_outputs(cfg, src_id: int, dst_id: int, pipeline_version: str):
+    """
+    Makes the processed outputs of `src_id` (filtered signal, envelope pyramid,
+    stored spectra, thumbnails, metadata) available under `dst_id` without recomputing them.
+    """
+    link_or_copy(recording_filtered_path(cfg, src_id), recording_filtered_path(cfg, dst_id))
+
+    src_env = recording_envelope_dir(cfg, src_id)
+    if os.path.isdir(src_env):
+        dst_env = recording_envelope_dir(cfg, dst_id)
+        os.makedirs(dst_env, exist_ok=True)
+        for name in os.listdir(src_env):
+            link_or_copy(os.path.join(src_env, name), os.path.join(dst_env, name))
+
+    # Array outputs only: the stage .json files hold paths of the source recording
+    src_stages = recording_stage_dir(cfg, src_id, pipeline_version)
+    dst_stages = recording_stage_dir(cfg, dst_id, pipeline_version)
+    for name in ("psd.npz", "thumb.png", "thumb.webp"):
+        src = os.path.join(src_stages, name)
+        if os.path.isfile(src):
+            os.makedirs(dst_stages, exist_ok=True)
+            link_or_copy(src, os.path.join(dst_stages, name))
+
+    meta = read_recording_meta(cfg, src_id)
+    if meta:
+        write_recording_meta(cfg, dst_id, meta)
+
+
+def remove_recording_outputs(cfg, recording_id: int):
+    """Undoes link_recording_outputs (e.g. when the upload that linked them is rolled back)."""
+    for path in (recording_filtered_path(cfg, recording_id), recording_meta_path(cfg, recording_id)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    shutil.rmtree(recording_envelope_dir(cfg, recording_id), ignore_errors=True)
+    shutil.rmtree(os.path.dirname(recording_stage_dir(cfg, recording_id, "")), ignore_errors=True)
@@ -0,0 +1,98 @@
+import os
+import select
+import socket
+import logging
+
+
+def _cfg_get(cfg, key, default=None):
+    if isinstance(cfg, dict):
+        return cfg.get(key, default)
+    return getattr(cfg, key, default)
+
+
+# --------------------------
+# Worker side
+# --------------------------
+
+def open_wakeup_socket(cfg):
+    """
+    Binds the local wakeup socket (Unix datagram) that idle workers listen on.
+    Returns None if the channel cannot be set up; workers then just poll.
+
+    In supervisor mode the socket is bound once and inherited by all children;
+    each datagram is received by exactly one of them.
+    """
+    path = _cfg_get(cfg, "WORKER_WAKEUP_SOCKET")
+    if not path or not hasattr(socket, "AF_UNIX"):
+        return None
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.unlink(path)  # stale socket from a previous run
+        except FileNotFoundError:
+            pass
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        sock.setblocking(False)
+        # Web app may run as another user; the datagram carries no data, only "look now"
+        os.chmod(path, 0o666)
+        logging.info("Worker wakeup socket listening on %s", path)
+        return sock
+    except OSError:
+        logging.warning("Worker wakeup socket unavailable (%s), falling back to polling", path, exc_info=True)
+        return None
+
+
+def close_wakeup_socket(cfg, sock):
+    if sock is None:
+        return
+    sock.close()
+    try:
+        os.unlink(_cfg_get(cfg, "WORKER_WAKEUP_SOCKET"))
+    except OSError:
+        pass
+
+
+def wait_for_wakeup(sock, timeout: float) -> bool:
+    """
+    Blocks up to `timeout` seconds. True if a notification was received.
+    Takes ONE datagram only: notify_workers(count=N) sends N, and each of
+    them should wake a different idle worker.
+    """
+    readable, _, _ = select.select([sock], [], [], timeout)
+    if not readable:
+        return False
+
+    try:
+        sock.recv(64)
+        return True
+    except (BlockingIOError, InterruptedError):
+        # Another worker process took it first
+        return False
+
+
+# --------------------------
+# Web app side
+# --------------------------
+
+def notify_workers(cfg, count: int = 1) -> bool:
+    """
+    Tells idle workers that new recordings are queued (best effort, never raises).
+    Sends `count` datagrams so up to `count` workers wake up.
+    """
+    path = _cfg_get(cfg, "WORKER_WAKEUP_SOCKET")
+    if not path or not hasattr(socket, "AF_UNIX"):
+        return False
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            for _ in range(max(1, count)):
+                sock.sendto(b"1", path)
+        return True
+    except OSError as e:
+        # No worker listening / buffer full: workers will find the job by polling
+        logging.debug("Worker wakeup not delivered (%s): %s", path, e)
+        return False
@@ -0,0 +1,122 @@
+import copy
+import time
+import threading
+from collections import OrderedDict
+
+# --------------------------
+# Read-through cache for hot, rarely changing rows (patients)
+# --------------------------
+# Per process. Writes in this process invalidate explicitly; writes from
+# other processes (other app workers, SQL by hand) are picked up within the TTL,
+# so credentials (user_repo.get_user_by_username) are not cached.
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire `ttl` seconds after they were stored."""
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=_MISSING):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(cfg, name: str) -> TTLCache:
+    """The named cache of this process (sized by REPO_CACHE_MAX_ENTRIES / REPO_CACHE_TTL_SECONDS)."""
+    cache = _caches.get(name)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(name)
+            if cache is None:
+                cache = _caches[name] = TTLCache(
+                    name,
+                    maxsize=cfg.get("REPO_CACHE_MAX_ENTRIES", 1024),
+                    ttl=cfg.get("REPO_CACHE_TTL_SECONDS", 60.0),
+                )
+    return cache
+
+
+def cached(cfg, name: str, key, load):
+    """
+    Read-through: value for `key` from cache `name`, else load() and store it.
+    None results are not cached (a missing row may be created any moment).
+    Callers get a copy, so mutating a returned row never changes the cache.
+    """
+    if not cfg.get("REPO_CACHE_TTL_SECONDS", 60.0):
+        return load()
+
+    cache = get_cache(cfg, name)
+    value = cache.get(key)
+    if value is _MISSING:
+        value = load()
+        if value is not None:
+            cache.set(key, value)
+    return copy.deepcopy(value)
+
+
+def invalidate(cfg, name: str, key=None):
+    """Drops one key (or the whole cache when key is None) after a write."""
+    cache = get_cache(cfg, name)
+    if key is None:
+        cache.clear()
+    else:
+        cache.invalidate(key)
+
+
+def cache_stats() -> list[dict]:
+    with _caches_lock:
+        caches = list(_caches.values())
+    return [c.stats() for c in sorted(caches, key=lambda c: c.name)]
@@ -1,17 +1,18 @@
+import contextvars
 import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
 import mariadb
 
 
 def get_conn(cfg):
-    logging.info(
-        "DB cfg: host=%r port=%r user=%r db=%r password_set=%s",
-        cfg.get("DB_HOST"),
-        cfg.get("DB_PORT", 3306),
-        cfg.get("DB_USER"),
-        cfg.get("DB_NAME"),
-        bool(cfg.get("DB_PASSWORD")),
-    )
-
+    """
+    Opens a NEW raw connection. Repositories should not call this directly;
+    they go through the pool via fetchone_dict / fetchall_dict / execute.
+    """
     return mariadb.connect(
         host=cfg["DB_HOST"],
         port=int(cfg.get("DB_PORT", 3306)),
@@ -23,48 +24,314 @@ def get_conn(cfg):
     )
 
 
-def _cursor(conn):
-    return conn.cursor(dictionary=True)
+# --------------------------
+# Connection pool
+# --------------------------
 
+class ConnectionPool:
+    """
+    Small thread-safe pool of mariadb connections (one pool per process).
 
-def fetchone_dict(cfg, sql: str, params=()):
-    conn = get_conn(cfg)
-    cur = _cursor(conn)
+    - at most `size` connections are checked out at the same time;
+      acquire() blocks up to `timeout` seconds for a free slot
+    - idle connections are pinged on checkout and replaced if dead
+    - connections are reused LIFO so the warmest one is handed out first
+    """
+
+    def __init__(self, cfg, size: int = 5, timeout: float = 10.0):
+        self._cfg = {
+            "DB_HOST": cfg["DB_HOST"],
+            "DB_PORT": cfg.get("DB_PORT", 3306),
+            "DB_USER": cfg["DB_USER"],
+            "DB_PASSWORD": cfg["DB_PASSWORD"],
+            "DB_NAME": cfg["DB_NAME"],
+        }
+        self.size = max(1, int(size))
+        self.timeout = float(timeout)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise mariadb.PoolError(
+                f"No free DB connection within {self.timeout}s (pool size {self.size})"
+            )
+
+        try:
+            conn = self._take_idle()
+            if conn is None:
+                conn = get_conn(self._cfg)
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, broken: bool = False):
+        try:
+            if broken:
+                _close_quietly(conn)
+                return
+            try:
+                # Never hand a half-finished transaction to the next caller
+                if not conn.autocommit:
+                    conn.rollback()
+                    conn.autocommit = True
+            except mariadb.Error:
+                _close_quietly(conn)
+                return
+            self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def _take_idle(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            try:
+                conn.ping()
+                return conn
+            except mariadb.Error:
+                logging.info("DB pool: dropping dead idle connection")
+                _close_quietly(conn)
+
+
+def _close_quietly(conn):
     try:
-        cur.execute(sql, params)
-        return cur.fetchone()
-    except Exception:
-        logging.exception("DB fetchone failed. SQL=%r params=%r", sql, params)
-        raise
-    finally:
-        cur.close()
         conn.close()
+    except Exception:
+        pass
 
 
-def fetchall_dict(cfg, sql: str, params=()):
-    conn = get_conn(cfg)
-    cur = _cursor(conn)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(cfg) -> ConnectionPool:
+    # Keyed by pid so forked worker processes never reuse the parent's sockets
+    key = (
+        os.getpid(),
+        cfg["DB_HOST"],
+        int(cfg.get("DB_PORT", 3306)),
+        cfg["DB_USER"],
+        cfg["DB_NAME"],
+    )
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                cfg,
+                size=cfg.get("DB_POOL_SIZE", 5),
+                timeout=cfg.get("DB_POOL_TIMEOUT", 10.0),
+            )
+            _pools[key] = pool
+            logging.info(
+                "DB pool created: host=%r port=%r user=%r db=%r size=%d pid=%d",
+                cfg.get("DB_HOST"),
+                cfg.get("DB_PORT", 3306),
+                cfg.get("DB_USER"),
+                cfg.get("DB_NAME"),
+                pool.size,
+                os.getpid(),
+            )
+    return pool
+
+
+# --------------------------
+# Pinned connection (per Flask request / per worker job)
+# --------------------------
+
+class _Pin:
+    """Holds the one connection used for the rest of a request/job (checked out lazily)."""
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.pool = None
+        self.conn = None
+
+    def checkout(self):
+        if self.conn is None:
+            self.pool = get_pool(self.cfg)
+            self.conn = self.pool.acquire()
+        return self.conn
+
+    def release(self, broken: bool = False):
+        if self.conn is not None:
+            self.pool.release(self.conn, broken=broken)
+            self.conn = None
+
+
+_pinned = contextvars.ContextVar("db_pinned_connection", default=None)
+
+
+def begin_pin(cfg):
+    """Start pinning: all queries until end_pin() share one pooled connection."""
+    if _pinned.get() is None:
+        _pinned.set(_Pin(cfg))
+
+
+def end_pin():
+    pin = _pinned.get()
+    if pin is not None:
+        _pinned.set(None)
+        pin.release()
+
+
+def release_pinned_connection():
+    """
+    Hands the pinned connection back to the pool before long non-DB work
+    (streaming an upload, rendering a plot), so it does not hold a pool slot
+    meanwhile. The pin stays active: the next query checks one out again.
+    No-op inside a transaction, which keeps its connection.
+    """
+    pin = _pinned.get()
+    if pin is None or pin.conn is None:
+        return
     try:
-        cur.execute(sql, params)
-        return cur.fetchall()
-    except Exception:
-        logging.exception("DB fetchall failed. SQL=%r params=%r", sql, params)
-        raise
+        in_transaction = not pin.conn.autocommit
+    except mariadb.Error:
+        in_transaction = False
+    if not in_transaction:
+        pin.release()
+
+
+@contextmanager
+def pinned_connection(cfg):
+    """
+    Context manager version of begin_pin/end_pin (used by the worker per job).
+    Nested use is a no-op; the outermost block owns the connection.
+    """
+    if _pinned.get() is not None:
+        yield
+        return
+
+    begin_pin(cfg)
+    try:
+        yield
     finally:
-        cur.close()
-        conn.close()
+        end_pin()
 
 
-def execute(cfg, sql: str, params=()):
-    conn = get_conn(cfg)
-    cur = _cursor(conn)
+@contextmanager
+def transaction(cfg):
+    """
+    Runs the enclosed repository calls in ONE database transaction
+    (commit on success, rollback on any exception).
+
+    Pins a connection for the block if none is pinned yet; nested use joins
+    the outer transaction.
+    """
+    with pinned_connection(cfg):
+        conn = _pinned.get().checkout()
+        if not conn.autocommit:
+            yield
+            return
+
+        conn.autocommit = False
+        try:
+            yield
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except mariadb.Error:
+                pass
+            raise
+        finally:
+            try:
+                conn.autocommit = True
+            except mariadb.Error:
+                pass
+
+
+def init_app(app):
+    """
+    Pin one DB connection per Flask request; only checked out if the view hits the DB.
+    Views doing long file I/O call release_pinned_connection() first.
+    """
+
+    @app.before_request
+    def _db_begin_pin():
+        begin_pin(app.config)
+
+    @app.teardown_request
+    def _db_end_pin(exc):
+        end_pin()
+
+
+def _is_connection_error(exc) -> bool:
+    return isinstance(exc, (mariadb.InterfaceError, mariadb.OperationalError))
+
+
+@contextmanager
+def _connection(cfg):
+    pin = _pinned.get()
+    if pin is not None:
+        conn = pin.checkout()
+        try:
+            yield conn
+        except Exception as e:
+            if _is_connection_error(e):
+                pin.release(broken=True)
+            raise
+        return
+
+    pool = get_pool(cfg)
+    conn = pool.acquire()
+    broken = False
     try:
-        logging.debug("EXECUTING SQL: %r | params=%r", sql, params)
-        cur.execute(sql, params)
-        return getattr(cur, "lastrowid", None)
-    except Exception:
-        logging.exception("DB execute failed. SQL=%r params=%r", sql, params)
+        yield conn
+    except Exception as e:
+        broken = _is_connection_error(e)
         raise
     finally:
-        cur.close()
-        conn.close()
+        pool.release(conn, broken=broken)
+
+
+def _cursor(conn):
+    return conn.cursor(dictionary=True)
+
+
+def fetchone_dict(cfg, sql: str, params=()):
+    with _connection(cfg) as conn:
+        cur = _cursor(conn)
+        try:
+            cur.execute(sql, params)
+            return cur.fetchone()
+        except Exception:
+            logging.exception("DB fetchone failed. SQL=%r params=%r", sql, params)
+            raise
+        finally:
+            cur.close()
+
+
+def fetchall_dict(cfg, sql: str, params=()):
+    with _connection(cfg) as conn:
+        cur = _cursor(conn)
+        try:
+            cur.execute(sql, params)
+            return cur.fetchall()
+        except Exception:
+            logging.exception("DB fetchall failed. SQL=%r params=%r", sql, params)
+            raise
+        finally:
+            cur.close()
+
+
+def execute(cfg, sql: str, params=()):
+    with _connection(cfg) as conn:
+        cur = _cursor(conn)
+        try:
+            logging.debug("EXECUTING SQL: %r | params=%r", sql, params)
+            cur.execute(sql, params)
+            return getattr(cur, "lastrowid", None)
+        except Exception:
+            logging.exception("DB execute failed. SQL=%r params=%r", sql, params)
+            raise
+        finally:
+            cur.close()
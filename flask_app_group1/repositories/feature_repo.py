@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+from repositories.db import execute, fetchall_dict
+from repositories.paging import decode_cursor, split_page
+
+# --------------------------
+# ECG features / flags (ecg_feature)
+# --------------------------
+# One row per (recording, lead, feature). lead_name IS NULL is the recording-level
+# summary (e.g. "sudden HR change on any lead"), which is what triage filters on.
+
+# Flags the clinician dashboard can filter on
+FLAG_TYPES = ("sudden_hr_change",)
+
+
+def _feature_rows(recording_id: int, flags: dict, detected_at):
+    """
+    Flattens process_recording()'s flags into ecg_feature rows.
+    bool -> is_flagged, numbers -> flag_value; notes and None values are skipped.
+    """
+    rows = [(recording_id, None, "sudden_hr_change", int(bool(flags.get("sudden_hr_change"))), None, detected_at)]
+
+    for lead in flags.get("leads", []):
+        for key, v in lead.items():
+            if key in ("lead", "note") or v is None:
+                continue
+            if isinstance(v, bool):
+                rows.append((recording_id, lead.get("lead"), key, int(v), None, detected_at))
+            elif isinstance(v, (int, float)):
+                rows.append((recording_id, lead.get("lead"), key, 0, float(v), detected_at))
+    return rows
+
+
+def replace_recording_features(cfg, recording_id: int, flags: dict):
+    """
+    Replaces the stored features of a recording (reprocessing overwrites).
+    Call inside db.transaction() together with the DONE status.
+    """
+    execute(cfg, "DELETE FROM ecg_feature WHERE recording_id=?", (recording_id,))
+
+    rows = _feature_rows(recording_id, flags, datetime.now())
+    placeholders = ",".join(["(?,?,?,?,?,?)"] * len(rows))
+    execute(
+        cfg,
+        f"""
+        INSERT INTO ecg_feature (recording_id, lead_name, flag_type, is_flagged, flag_value, detected_at)
+        VALUES {placeholders}
+        """,
+        tuple(v for row in rows for v in row),
+    )
+
+
+def list_flagged_recordings(
+    cfg,
+    flag_type: str,
+    days: int | None = None,
+    status: str | None = None,
+    patient_id: int | None = None,
+    date_from=None,
+    date_to=None,
+    after: str | None = None,
+    limit: int = 50,
+):
+    """
+    One page of recordings with `flag_type` set, newest detection first, with
+    the same listing filters as recording_repo.list_recordings_page.
+    Served by idx_feature_flag_time (flag_type, is_flagged, lead_name, detected_at);
+    pages seek on (detected_at, recording_id) from the `after` cursor.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    since = datetime.now() - timedelta(days=days) if days else datetime(1970, 1, 1)
+    where = [
+        "f.flag_type = ?",
+        "f.is_flagged = 1",
+        "f.lead_name IS NULL",
+        "f.detected_at >= ?",
+    ]
+    params = [flag_type, since]
+    if status:
+        where.append("e.status = ?")
+        params.append(status)
+    if patient_id is not None:
+        where.append("e.patient_id = ?")
+        params.append(patient_id)
+    if date_from:
+        where.append("e.upload_time >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("e.upload_time < ?")
+        params.append(date_to)
+
+    key = decode_cursor(after, 2)
+    if key:
+        last_time, last_id = datetime.fromisoformat(key[0]), int(key[1])
+        where.append("(f.detected_at < ? OR (f.detected_at = ? AND f.recording_id < ?))")
+        params += [last_time, last_time, last_id]
+
+    rows = fetchall_dict(
+        cfg,
+        f"""
+        SELECT e.recording_id, e.patient_id, e.upload_time, e.status, e.error_message,
+               f.detected_at
+        FROM ecg_feature f
+        JOIN ecg e ON e.recording_id = f.recording_id
+        WHERE {" AND ".join(where)}
+        ORDER BY f.detected_at DESC, f.recording_id DESC
+        LIMIT ?
+        """,
+        tuple(params) + (limit + 1,),
+    )
+    return split_page(rows, limit, lambda r: (r["detected_at"], r["recording_id"]))
+
+
+def copy_recording_features(cfg, src_id: int, dst_id: int):
+    """Copies the features of an identical, already processed recording."""
+    execute(cfg, "DELETE FROM ecg_feature WHERE recording_id=?", (dst_id,))
+    execute(
+        cfg,
+        """
+        INSERT INTO ecg_feature (recording_id, lead_name, flag_type, is_flagged, flag_value, detected_at)
+        SELECT ?, lead_name, flag_type, is_flagged, flag_value, NOW()
+        FROM ecg_feature
+        WHERE recording_id=?
+        """,
+        (dst_id, src_id),
+    )
+
+
+def copy_recording_features_many(cfg, pairs: list[tuple]):
+    """copy_recording_features for several (src_id, dst_id) pairs in one INSERT ... SELECT."""
+    if not pairs:
+        return
+    dst_ids = [dst for _, dst in pairs]
+    execute(
+        cfg,
+        f"DELETE FROM ecg_feature WHERE recording_id IN ({','.join(['?'] * len(dst_ids))})",
+        tuple(dst_ids),
+    )
+    mapping = " UNION ALL ".join(["SELECT ? AS src_id, ? AS dst_id"] * len(pairs))
+    execute(
+        cfg,
+        f"""
+        INSERT INTO ecg_feature (recording_id, lead_name, flag_type, is_flagged, flag_value, detected_at)
+        SELECT m.dst_id, f.lead_name, f.flag_type, f.is_flagged, f.flag_value, NOW()
+        FROM ecg_feature f
+        JOIN ({mapping}) m ON m.src_id = f.recording_id
+        """,
+        tuple(v for pair in pairs for v in pair),
+    )
@@ -0,0 +1,193 @@
+import re
+import logging
+
+from repositories.db import execute, fetchone_dict, fetchall_dict, pinned_connection
+
+# --------------------------
+# Versioned schema migrations
+# --------------------------
+# Run once at startup (create_app and worker main), never per request.
+# Applied versions are recorded in schema_migrations. Every statement is
+# idempotent (IF NOT EXISTS), so a database set up by the old per-call
+# ensure_* functions, or a migration interrupted half-way, is simply replayed.
+# Append new migrations at the end; never edit or renumber an applied one.
+# A step is an SQL string, or a function(cfg) for steps that need a lookup first.
+
+
+def _dedupe_ecg_signal(cfg):
+    """
+    Deletes duplicate (recording_id, signal_type) rows of ecg_signal from before
+    the unique key existed, keeping the newest (highest primary key) of each.
+    """
+    pk = fetchall_dict(
+        cfg,
+        """
+        SELECT COLUMN_NAME AS name
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'ecg_signal' AND CONSTRAINT_NAME = 'PRIMARY'
+        """,
+    )
+    if len(pk) != 1 or not re.fullmatch(r"\w+", pk[0]["name"]):
+        raise RuntimeError("ecg_signal needs a single-column primary key to remove duplicates")
+    col = pk[0]["name"]
+
+    execute(
+        cfg,
+        f"""
+        DELETE s1 FROM ecg_signal s1
+        JOIN ecg_signal s2
+          ON s2.recording_id = s1.recording_id
+         AND s2.signal_type = s1.signal_type
+         AND s2.`{col}` > s1.`{col}`
+        """,
+    )
+
+
+def _has_unique_key(cfg, table: str, columns) -> bool:
+    """True if `table` already has a UNIQUE/PRIMARY key on exactly these columns (any name, any order)."""
+    rows = fetchall_dict(
+        cfg,
+        """
+        SELECT INDEX_NAME AS name, GROUP_CONCAT(COLUMN_NAME ORDER BY SEQ_IN_INDEX) AS cols
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = ? AND NON_UNIQUE = 0
+        GROUP BY INDEX_NAME
+        """,
+        (table,),
+    )
+    return any(set(r["cols"].split(",")) == set(columns) for r in rows)
+
+
+def _unique_ecg_signal(cfg):
+    # upsert_signal_path(s) relies on this key for ON DUPLICATE KEY UPDATE
+    if _has_unique_key(cfg, "ecg_signal", ("recording_id", "signal_type")):
+        return
+    _dedupe_ecg_signal(cfg)
+    execute(
+        cfg,
+        """
+        ALTER TABLE ecg_signal
+          ADD UNIQUE KEY uq_signal_recording_type (recording_id, signal_type)
+        """,
+    )
+
+
+MIGRATIONS = [
+    (1, "clinician_comment table", [
+        """
+        CREATE TABLE IF NOT EXISTS clinician_comment (
+          comment_id INT AUTO_INCREMENT PRIMARY KEY,
+          recording_id INT NOT NULL,
+          clinician_user_id INT NOT NULL,
+          comment_text TEXT NOT NULL,
+          created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+        """,
+    ]),
+    (2, "worker claim columns", [
+        """
+        ALTER TABLE ecg
+          ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(64) NULL,
+          ADD COLUMN IF NOT EXISTS claimed_at DATETIME NULL,
+          ADD COLUMN IF NOT EXISTS claim_token CHAR(32) NULL,
+          ADD COLUMN IF NOT EXISTS attempts INT NOT NULL DEFAULT 0,
+          ADD INDEX IF NOT EXISTS idx_ecg_claim_token (claim_token)
+        """,
+    ]),
+    (3, "ecg_feature table", [
+        """
+        CREATE TABLE IF NOT EXISTS ecg_feature (
+          feature_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+          recording_id INT NOT NULL,
+          lead_name VARCHAR(32) NULL,
+          flag_type VARCHAR(64) NOT NULL,
+          is_flagged TINYINT(1) NOT NULL DEFAULT 0,
+          flag_value DOUBLE NULL,
+          detected_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          KEY idx_feature_flag_time (flag_type, is_flagged, lead_name, detected_at),
+          KEY idx_feature_recording (recording_id)
+        ) ENGINE=InnoDB
+        """,
+    ]),
+    (4, "ecg.content_hash (upload dedup)", [
+        """
+        ALTER TABLE ecg
+          ADD COLUMN IF NOT EXISTS content_hash CHAR(64) NULL,
+          ADD INDEX IF NOT EXISTS idx_ecg_content_hash (content_hash)
+        """,
+    ]),
+    (5, "listing indexes (keyset pagination, queue scan)", [
+        # idx_ecg_status_upload also serves claim_next_jobs
+        # (status='QUEUED' ORDER BY upload_time)
+        """
+        ALTER TABLE ecg
+          ADD INDEX IF NOT EXISTS idx_ecg_upload (upload_time, recording_id),
+          ADD INDEX IF NOT EXISTS idx_ecg_status_upload (status, upload_time, recording_id),
+          ADD INDEX IF NOT EXISTS idx_ecg_patient_upload (patient_id, upload_time, recording_id)
+        """,
+        "ALTER TABLE patient ADD INDEX IF NOT EXISTS idx_patient_name (name, patient_id)",
+    ]),
+    (6, "full-text search indexes", [
+        "ALTER TABLE patient ADD FULLTEXT INDEX IF NOT EXISTS ft_patient_name (name)",
+        "ALTER TABLE clinician_comment ADD FULLTEXT INDEX IF NOT EXISTS ft_comment_text (comment_text)",
+    ]),
+    (7, "clinician_comment (recording_id, created_at)", [
+        """
+        ALTER TABLE clinician_comment
+          ADD INDEX IF NOT EXISTS idx_comment_recording_time (recording_id, created_at)
+        """,
+    ]),
+    (8, "unique ecg_signal (recording_id, signal_type)", [
+        _unique_ecg_signal,
+    ]),
+]
+
+# Held while migrating, so an app and several workers starting at once
+# do not run the same DDL side by side
+_LOCK_NAME = "ecg_schema_migrations"
+_LOCK_TIMEOUT_SECONDS = 300
+
+
+def _applied_versions(cfg) -> set:
+    rows = fetchall_dict(cfg, "SELECT version FROM schema_migrations")
+    return {r["version"] for r in rows}
+
+
+def migrate(cfg) -> list[int]:
+    """Applies the pending migrations in order. Returns the versions applied now."""
+    applied_now = []
+    # GET_LOCK is per connection: keep one connection for the whole run
+    with pinned_connection(cfg):
+        execute(
+            cfg,
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+              version INT PRIMARY KEY,
+              name VARCHAR(255) NOT NULL,
+              applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB
+            """,
+        )
+
+        got = fetchone_dict(cfg, "SELECT GET_LOCK(?, ?) AS got", (_LOCK_NAME, _LOCK_TIMEOUT_SECONDS))
+        if not got or not got["got"]:
+            raise RuntimeError(f"Could not get the schema migration lock within {_LOCK_TIMEOUT_SECONDS}s")
+        try:
+            done = _applied_versions(cfg)
+            for version, name, statements in MIGRATIONS:
+                if version in done:
+                    continue
+                logging.info("DB migration %d: %s", version, name)
+                for step in statements:
+                    if callable(step):
+                        step(cfg)
+                    else:
+                        execute(cfg, step)
+                execute(cfg, "INSERT INTO schema_migrations (version, name) VALUES (?,?)", (version, name))
+                applied_now.append(version)
+        finally:
+            execute(cfg, "DO RELEASE_LOCK(?)", (_LOCK_NAME,))
+
+    if applied_now:
+        logging.info("DB schema migrated to version %d", MIGRATIONS[-1][0])
+    return applied_now
@@ -0,0 +1,39 @@
+import json
+import base64
+
+# --------------------------
+# Keyset (seek) pagination
+# --------------------------
+# A page is fetched with "WHERE (sort key) < (last key of the previous page)"
+# instead of OFFSET, so page 1000 costs the same as page 1 (an index range scan).
+# The cursor is the last row's sort key, opaque to the client.
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(list(values), default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str | None, n_values: int):
+    """Sort key from a cursor, None for the first page. Raises ValueError if malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid page cursor") from e
+    if not isinstance(values, list) or len(values) != n_values:
+        raise ValueError("Invalid page cursor")
+    return values
+
+
+def split_page(rows: list, limit: int, key):
+    """
+    Rows were fetched with LIMIT limit+1: returns (page, next_cursor),
+    next_cursor is None on the last page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(key(page[-1]))
@@ -1,8 +1,14 @@
 from repositories.db import fetchone_dict, fetchall_dict, execute
+from repositories.cache import cached, invalidate
+from repositories.paging import decode_cursor, split_page
+
+# Read-through caches (repositories.cache); writes below invalidate them
+_BY_USER = "patient_by_user_id"
+_BY_ID = "patient_by_id"
 
 
 def get_patient_by_user_id(cfg, user_id: int):
-    return fetchone_dict(
+    return cached(cfg, _BY_USER, user_id, lambda: fetchone_dict(
         cfg,
         """
         SELECT *
@@ -10,11 +16,11 @@ def get_patient_by_user_id(cfg, user_id: int):
         WHERE user_id=?
         """,
         (user_id,),
-    )
+    ))
 
 
 def get_patient_by_id(cfg, patient_id: int):
-    return fetchone_dict(
+    return cached(cfg, _BY_ID, patient_id, lambda: fetchone_dict(
         cfg,
         """
         SELECT *
@@ -22,18 +28,62 @@ def get_patient_by_id(cfg, patient_id: int):
         WHERE patient_id=?
         """,
         (patient_id,),
-    )
+    ))
+
+
+def list_patients_page(cfg, order: str = "id", name_prefix: str | None = None, after: str | None = None, limit: int = 50):
+    """
+    One page of patients ordered by patient_id or by (name, patient_id),
+    optionally only names starting with `name_prefix`.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if order not in ("id", "name"):
+        raise ValueError(f"Unknown patient order {order!r}")
 
+    where, params = [], []
+    if name_prefix:
+        # LIKE 'abc%' kan bruge idx_patient_name
+        escaped = name_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        where.append("name LIKE ?")
+        params.append(escaped + "%")
 
-def list_patients(cfg):
-    return fetchall_dict(
+    if order == "name":
+        key = decode_cursor(after, 2)
+        if key and key[0] is None:
+            # NULL-navne sorteres først
+            where.append("(name IS NOT NULL OR patient_id > ?)")
+            params.append(int(key[1]))
+        elif key:
+            where.append("(name > ? OR (name = ? AND patient_id > ?))")
+            params += [key[0], key[0], int(key[1])]
+        order_by = "name, patient_id"
+        sort_key = lambda r: (r["name"], r["patient_id"])
+    else:
+        key = decode_cursor(after, 1)
+        if key:
+            where.append("patient_id > ?")
+            params.append(int(key[0]))
+        order_by = "patient_id"
+        sort_key = lambda r: (r["patient_id"],)
+
+    rows = fetchall_dict(
         cfg,
-        """
+        f"""
         SELECT *
         FROM patient
-        ORDER BY patient_id
-        """
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY {order_by}
+        LIMIT ?
+        """,
+        tuple(params) + (limit + 1,),
     )
+    return split_page(rows, limit, sort_key)
+
+
+def _invalidate_patient(cfg, user_id: int, patient_id: int | None):
+    invalidate(cfg, _BY_USER, user_id)
+    if patient_id is not None:
+        invalidate(cfg, _BY_ID, patient_id)
 
 
 def update_patient_by_user_id(cfg, user_id: int, name: str):
@@ -50,6 +100,8 @@ def update_patient_by_user_id(cfg, user_id: int, name: str):
         """,
         (name, user_id),
     )
+    row = fetchone_dict(cfg, "SELECT patient_id FROM patient WHERE user_id=?", (user_id,))
+    _invalidate_patient(cfg, user_id, row["patient_id"] if row else None)
 
 
 def ensure_patient_for_user(cfg, user_id: int, name: str | None = None):
@@ -77,4 +129,5 @@ def ensure_patient_for_user(cfg, user_id: int, name: str | None = None):
         """,
         (user_id, name),
     )
+    _invalidate_patient(cfg, user_id, patient_id)
     return patient_id
@@ -1,5 +1,8 @@
+import uuid
 from datetime import datetime, timedelta
-from repositories.db import fetchone_dict, fetchall_dict, execute
+from repositories.db import fetchone_dict, fetchall_dict, execute, transaction
+from repositories.feature_repo import replace_recording_features
+from repositories.paging import decode_cursor, split_page
 
 # --------------------------
 # ECG recording (metadata)
@@ -21,6 +24,35 @@ def create_recording(cfg, patient_id: int, uploaded_by: int | None):
     return recording_id
 
 
+def create_recordings_bulk(cfg, patient_id: int, uploaded_by: int | None, content_hashes: list[str]) -> list[int]:
+    """
+    Creates one QUEUED recording per content hash with a single multi-row INSERT.
+
+    The ids are read back with INSERT ... RETURNING (MariaDB >= 10.5), in row
+    order; they need not be consecutive (innodb_autoinc_lock_mode=2,
+    auto_increment_increment > 1 on Galera).
+    """
+    if not content_hashes:
+        return []
+
+    now = datetime.now()
+    end_time = now + timedelta(seconds=20)
+    rows = [(patient_id, uploaded_by, now, end_time, h) for h in content_hashes]
+
+    inserted = fetchall_dict(
+        cfg,
+        f"""
+        INSERT INTO ecg (patient_id, uploaded_by, start_time, end_time, content_hash, status)
+        VALUES {",".join(["(?,?,?,?,?, 'QUEUED')"] * len(rows))}
+        RETURNING recording_id
+        """,
+        tuple(v for row in rows for v in row),
+    )
+    if len(inserted) != len(rows):
+        raise RuntimeError(f"Bulk insert returned {len(inserted)} ids for {len(rows)} rows")
+    return [r["recording_id"] for r in inserted]
+
+
 def set_status(cfg, recording_id: int, status: str, error_message=None, pipeline_version=None):
     execute(
         cfg,
@@ -33,35 +65,76 @@ def set_status(cfg, recording_id: int, status: str, error_message=None, pipeline
     )
 
 
-def list_recent_recordings(cfg, limit=50):
-    return fetchall_dict(
+def set_status_many(cfg, recording_ids: list[int], status: str, pipeline_version=None):
+    """set_status for several recordings in one UPDATE."""
+    if not recording_ids:
+        return
+    execute(
         cfg,
-        """
-        SELECT recording_id, patient_id, upload_time, status, error_message
-        FROM ecg
-        ORDER BY upload_time DESC
-        LIMIT ?
+        f"""
+        UPDATE ecg
+        SET status=?, error_message=NULL, pipeline_version=COALESCE(?, pipeline_version)
+        WHERE recording_id IN ({",".join(["?"] * len(recording_ids))})
         """,
-        (limit,),
+        (status, pipeline_version, *recording_ids),
     )
 
 
-def list_recordings_for_patient(cfg, patient_id: int, limit: int = 50):
+def list_recordings_page(
+    cfg,
+    status: str | None = None,
+    patient_id: int | None = None,
+    date_from=None,
+    date_to=None,
+    after: str | None = None,
+    limit: int = 50,
+):
     """
-    Bruges af patientens Medical Record.
-    Returnerer KUN patientens egne uploads.
+    One page of recordings, newest first, optionally filtered.
+    Seeks on (upload_time, recording_id) from the `after` cursor, so every page
+    is an index range scan however deep it is.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
     """
-    return fetchall_dict(
+    where, params = [], []
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if patient_id is not None:
+        where.append("patient_id = ?")
+        params.append(patient_id)
+    if date_from:
+        where.append("upload_time >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("upload_time < ?")
+        params.append(date_to)
+
+    key = decode_cursor(after, 2)
+    if key:
+        last_time, last_id = datetime.fromisoformat(key[0]), int(key[1])
+        where.append("(upload_time < ? OR (upload_time = ? AND recording_id < ?))")
+        params += [last_time, last_time, last_id]
+
+    rows = fetchall_dict(
         cfg,
-        """
+        f"""
         SELECT recording_id, patient_id, upload_time, status, error_message
         FROM ecg
-        WHERE patient_id = ?
-        ORDER BY upload_time DESC
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY upload_time DESC, recording_id DESC
         LIMIT ?
         """,
-        (patient_id, limit),
+        tuple(params) + (limit + 1,),
     )
+    return split_page(rows, limit, lambda r: (r["upload_time"], r["recording_id"]))
+
+
+def list_recordings_for_patient(cfg, patient_id: int, limit: int = 50, after: str | None = None):
+    """
+    Bruges af patientens Medical Record.
+    Returnerer KUN patientens egne uploads, som (rows, next_cursor).
+    """
+    return list_recordings_page(cfg, patient_id=patient_id, after=after, limit=limit)
 
 
 def get_recording(cfg, recording_id: int):
@@ -72,24 +145,183 @@ def get_recording(cfg, recording_id: int):
     )
 
 
-def fetch_next_queued(cfg):
+# --------------------------
+# Job claiming (worker queue)
+# --------------------------
+
+def claim_next_jobs(cfg, worker_id: str, batch_size: int = 1, pipeline_version=None):
+    """
+    Atomically claims up to `batch_size` QUEUED recordings for one worker.
+
+    The claim is a single UPDATE (QUEUED -> PROCESSING + worker id + claim time),
+    so two workers can never get the same recording. A random claim token
+    identifies exactly the rows this call won.
+    """
+    token = uuid.uuid4().hex
+    execute(
+        cfg,
+        """
+        UPDATE ecg
+        SET status='PROCESSING',
+            error_message=NULL,
+            claimed_by=?,
+            claimed_at=NOW(),
+            claim_token=?,
+            attempts=attempts + 1,
+            pipeline_version=COALESCE(?, pipeline_version)
+        WHERE status='QUEUED'
+          AND EXISTS (
+            SELECT 1
+            FROM ecg_signal s
+            WHERE s.recording_id = ecg.recording_id
+              AND s.signal_type = 'raw'
+              AND s.file_path IS NOT NULL
+              AND s.file_path <> ''
+          )
+        ORDER BY upload_time ASC
+        LIMIT ?
+        """,
+        (worker_id, token, pipeline_version, int(batch_size)),
+    )
+    return fetchall_dict(
+        cfg,
+        """
+        SELECT recording_id, claimed_by, claimed_at
+        FROM ecg
+        WHERE claim_token=?
+        ORDER BY upload_time ASC
+        """,
+        (token,),
+    )
+
+
+def release_claims(cfg, recording_ids: list[int]):
+    """
+    Puts claimed-but-not-started recordings back in the queue
+    (graceful worker shutdown). The attempt is not counted.
+    """
+    if not recording_ids:
+        return
+
+    placeholders = ",".join(["?"] * len(recording_ids))
+    execute(
+        cfg,
+        f"""
+        UPDATE ecg
+        SET status='QUEUED', claimed_by=NULL, claimed_at=NULL, claim_token=NULL,
+            attempts=GREATEST(attempts - 1, 0)
+        WHERE status='PROCESSING' AND recording_id IN ({placeholders})
+        """,
+        tuple(recording_ids),
+    )
+
+
+def requeue_dead_worker_claims(cfg, worker_id: str, max_attempts: int = 3):
+    """
+    Recovers recordings held by a worker process that died mid-job.
+    Requeued unless they already used `max_attempts` (then FAILED, so one
+    bad file cannot crash workers forever).
+    """
+    execute(
+        cfg,
+        """
+        UPDATE ecg
+        SET status='FAILED',
+            error_message=CONCAT('Worker died while processing (attempt ', attempts, ')'),
+            claim_token=NULL
+        WHERE status='PROCESSING' AND claimed_by=? AND attempts >= ?
+        """,
+        (worker_id, max_attempts),
+    )
+    execute(
+        cfg,
+        """
+        UPDATE ecg
+        SET status='QUEUED', claimed_by=NULL, claimed_at=NULL, claim_token=NULL
+        WHERE status='PROCESSING' AND claimed_by=?
+        """,
+        (worker_id,),
+    )
+
+
+def list_claiming_workers(cfg, host: str) -> list[str]:
+    """Worker ids ("<host>:<pid>") on `host` that still hold PROCESSING recordings."""
+    escaped = host.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    rows = fetchall_dict(
+        cfg,
+        """
+        SELECT DISTINCT claimed_by
+        FROM ecg
+        WHERE status='PROCESSING' AND claimed_by LIKE ?
+        """,
+        (escaped + ":%",),
+    )
+    return [r["claimed_by"] for r in rows]
+
+
+# --------------------------
+# Content hash (dedup of identical uploads)
+# --------------------------
+
+def set_content_hash(cfg, recording_id: int, content_hash: str):
+    execute(
+        cfg,
+        "UPDATE ecg SET content_hash=? WHERE recording_id=?",
+        (content_hash, recording_id),
+    )
+
+
+def find_processed_duplicate(cfg, content_hash: str, pipeline_version: str, exclude_id: int):
+    """Newest DONE recording with identical raw content, processed by `pipeline_version`."""
     return fetchone_dict(
         cfg,
         """
-        SELECT e.recording_id
+        SELECT e.recording_id, s.sample_rate
         FROM ecg e
         JOIN ecg_signal s
           ON s.recording_id = e.recording_id
-         AND s.signal_type = 'raw'
-         AND s.file_path IS NOT NULL
-         AND s.file_path <> ''
-        WHERE e.status='QUEUED'
-        ORDER BY e.upload_time ASC
+         AND s.signal_type = 'filtered'
+        WHERE e.content_hash = ?
+          AND e.status = 'DONE'
+          AND e.pipeline_version = ?
+          AND e.recording_id <> ?
+        ORDER BY e.recording_id DESC
         LIMIT 1
-        """
+        """,
+        (content_hash, pipeline_version, exclude_id),
     )
 
 
+def find_processed_duplicates(cfg, content_hashes: list[str], pipeline_version: str) -> dict:
+    """
+    find_processed_duplicate for a batch in one query:
+    {content_hash: {"recording_id", "sample_rate"}} for the hashes that have one.
+    """
+    hashes = sorted(set(content_hashes))
+    if not hashes:
+        return {}
+    rows = fetchall_dict(
+        cfg,
+        f"""
+        SELECT e.content_hash, e.recording_id, s.sample_rate
+        FROM ecg e
+        JOIN ecg_signal s
+          ON s.recording_id = e.recording_id
+         AND s.signal_type = 'filtered'
+        WHERE e.content_hash IN ({",".join(["?"] * len(hashes))})
+          AND e.status = 'DONE'
+          AND e.pipeline_version = ?
+        ORDER BY e.recording_id DESC
+        """,
+        (*hashes, pipeline_version),
+    )
+    dups = {}
+    for r in rows:
+        # Newest first, like find_processed_duplicate
+        dups.setdefault(r["content_hash"], {"recording_id": r["recording_id"], "sample_rate": r["sample_rate"]})
+    return dups
+
+
 # --------------------------
 # File references (ecg_signal)
 # --------------------------
@@ -108,6 +340,42 @@ def upsert_signal_path(cfg, recording_id: int, signal_type: str, file_path: str,
     )
 
 
+def upsert_signal_paths(cfg, rows: list[tuple]):
+    """Multi-row upsert_signal_path; rows are (recording_id, signal_type, file_path, sample_rate)."""
+    if not rows:
+        return
+    execute(
+        cfg,
+        f"""
+        INSERT INTO ecg_signal (recording_id, signal_type, file_path, sample_rate)
+        VALUES {",".join(["(?,?,?,?)"] * len(rows))}
+        ON DUPLICATE KEY UPDATE
+          file_path=VALUES(file_path),
+          sample_rate=VALUES(sample_rate)
+        """,
+        tuple(v for row in rows for v in row),
+    )
+
+
+def complete_recording(cfg, recording_id: int, result: dict, pipeline_version=None):
+    """
+    Job completion as ONE transaction on one connection: filtered path + sample
+    rate, both plot paths, features and DONE. A worker dying half-way leaves
+    the recording exactly as it was (PROCESSING, requeued by the supervisor).
+    """
+    fs = result["fs"]
+    rows = [(recording_id, "filtered", result["filtered_path"], fs)]
+    if result.get("time_plot_path"):
+        rows.append((recording_id, "time_plot", result["time_plot_path"], None))
+    if result.get("freq_plot_path"):
+        rows.append((recording_id, "freq_plot", result["freq_plot_path"], None))
+
+    with transaction(cfg):
+        upsert_signal_paths(cfg, rows)
+        replace_recording_features(cfg, recording_id, result["flags"])
+        set_status(cfg, recording_id, "DONE", pipeline_version=pipeline_version)
+
+
 def get_signal_path(cfg, recording_id: int, signal_type: str):
     return fetchone_dict(
         cfg,
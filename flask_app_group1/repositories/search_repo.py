@@ -0,0 +1,73 @@
+from repositories.db import fetchall_dict
+from repositories.paging import decode_cursor, split_page
+
+# --------------------------
+# Full-text search (patient name + clinician comments)
+# --------------------------
+# InnoDB FULLTEXT indexes; a search is an inverted-index lookup and does not
+# scan the tables. NOTE: InnoDB only indexes words of at least
+# innodb_ft_min_token_size characters (default 3), so "AF" needs that set to 2
+# in the server config (and the indexes rebuilt) to be searchable.
+
+MIN_QUERY_LENGTH = 2
+# Best-matching comments / patient rows considered per search, so a common
+# word does not aggregate the whole comment table. Matches beyond this are
+# not reachable by paging.
+MAX_CANDIDATES = 1000
+
+
+def search_recordings(cfg, query: str, after: str | None = None, limit: int = 50):
+    """
+    Recordings whose patient name or clinician comments match `query`
+    (natural language mode), best match first.
+
+    A recording's score is the sum of its matching comments' and its patient
+    name's relevance, over the MAX_CANDIDATES best comment and patient matches.
+    Pages seek on (score, recording_id) from the `after` cursor.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    query = (query or "").strip()
+    if len(query) < MIN_QUERY_LENGTH:
+        return [], None
+
+    where, params = "", []
+    key = decode_cursor(after, 2)
+    if key:
+        last_score, last_id = float(key[0]), int(key[1])
+        where = "WHERE (h.score < ? OR (h.score = ? AND h.recording_id < ?))"
+        params = [last_score, last_score, last_id]
+
+    rows = fetchall_dict(
+        cfg,
+        f"""
+        SELECT e.recording_id, e.patient_id, e.upload_time, e.status,
+               p.name AS patient_name, h.score, h.matched
+        FROM (
+          -- Rounded, so the score in the cursor compares exactly
+          SELECT recording_id, ROUND(SUM(score), 6) AS score,
+                 GROUP_CONCAT(DISTINCT source ORDER BY source) AS matched
+          FROM (
+            (SELECT c.recording_id, MATCH(c.comment_text) AGAINST (?) AS score, 'comment' AS source
+             FROM clinician_comment c
+             WHERE MATCH(c.comment_text) AGAINST (?)
+             ORDER BY score DESC
+             LIMIT ?)
+            UNION ALL
+            (SELECT pe.recording_id, MATCH(pp.name) AGAINST (?) AS score, 'patient' AS source
+             FROM patient pp
+             JOIN ecg pe ON pe.patient_id = pp.patient_id
+             WHERE MATCH(pp.name) AGAINST (?)
+             ORDER BY score DESC
+             LIMIT ?)
+          ) m
+          GROUP BY recording_id
+        ) h
+        JOIN ecg e ON e.recording_id = h.recording_id
+        LEFT JOIN patient p ON p.patient_id = e.patient_id
+        {where}
+        ORDER BY h.score DESC, h.recording_id DESC
+        LIMIT ?
+        """,
+        (query, query, MAX_CANDIDATES, query, query, MAX_CANDIDATES, *params, limit + 1),
+    )
+    return split_page(rows, limit, lambda r: (r["score"], r["recording_id"]))
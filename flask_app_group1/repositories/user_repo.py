@@ -4,6 +4,7 @@ from repositories.db import fetchone_dict, fetchall_dict, execute
 
 def get_user_by_username(cfg, username: str):
     # NOTE: MariaDB connector uses ? placeholders (not %s)
+    # Not cached: login must see a password reset or role change made by any process at once
     return fetchone_dict(cfg, "SELECT * FROM `user` WHERE username=?", (username,))
 
 
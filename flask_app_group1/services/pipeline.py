@@ -0,0 +1,130 @@
+import os
+import json
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Callable
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One named step of the processing pipeline.
+
+    fn(ctx, inputs) -> dict, where `inputs` maps each dependency name to its
+    output. The output must be JSON-serializable; large arrays are written to
+    files (under ctx.stage_dir) and referenced by path. Paths listed under the
+    output key "files" must still exist for a memoized output to be reused.
+
+    memo=False stages always run (cheap ones, e.g. reading the header); if
+    their output differs from the memoized one, everything below them is redone.
+
+    `config` names the cfg keys the output depends on; their values are hashed
+    into the memo, so changing one of them redoes the stage (and those below it).
+    """
+    name: str
+    fn: Callable
+    deps: tuple = ()
+    memo: bool = True
+    config: tuple = ()
+
+
+@dataclass
+class StageContext:
+    cfg: object
+    recording_id: int
+    stage_dir: str
+    # Outputs computed/loaded so far in this run (stage name -> output)
+    outputs: dict = field(default_factory=dict)
+
+
+def _output_path(stage_dir: str, name: str) -> str:
+    return os.path.join(stage_dir, f"{name}.json")
+
+
+def config_hash(cfg, keys) -> str:
+    """Short hash of the cfg values a stage depends on."""
+    values = {k: cfg.get(k) for k in sorted(keys)}
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _load_output(stage_dir: str, name: str, cfg_hash: str):
+    try:
+        with open(_output_path(stage_dir, name), encoding="utf-8") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(saved, dict) or saved.get("config_hash") != cfg_hash:
+        return None  # other settings (or an old memo format)
+    out = saved.get("output")
+    if not isinstance(out, dict) or not all(os.path.exists(p) for p in out.get("files", [])):
+        return None
+    return out
+
+
+def _save_output(stage_dir: str, name: str, out: dict, cfg_hash: str):
+    path = _output_path(stage_dir, name)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"config_hash": cfg_hash, "output": out}, f)
+    os.replace(tmp, path)
+
+
+def _downstream(stages: dict, names) -> set:
+    """`names` plus every stage that (transitively) depends on one of them."""
+    result = set(names)
+    changed = True
+    while changed:
+        changed = False
+        for s in stages.values():
+            if s.name not in result and any(d in result for d in s.deps):
+                result.add(s.name)
+                changed = True
+    return result
+
+
+def run_stages(cfg, recording_id: int, stages: list[Stage], stage_dir: str, targets=None, force=()) -> dict:
+    """
+    Runs `targets` (default: all stages) and whatever they depend on.
+
+    Each stage output is memoized as stage_dir/<name>.json, together with the
+    hash of the stage's `config` values. A stage whose output is already there
+    (for the same settings) is loaded instead of recomputed, so re-running
+    one stage (force=("features",)) only recomputes it and the stages below it.
+    Returns {stage name: output} for every stage that was needed.
+    """
+    by_name = {s.name: s for s in stages}
+    for name in list(force) + list(targets or []):
+        if name not in by_name:
+            raise ValueError(f"Unknown pipeline stage {name!r}")
+
+    os.makedirs(stage_dir, exist_ok=True)
+    stale = _downstream(by_name, force)
+    ctx = StageContext(cfg=cfg, recording_id=recording_id, stage_dir=stage_dir)
+
+    def _run(name, path=()):
+        if name in ctx.outputs:
+            return ctx.outputs[name]
+        if name in path:
+            raise ValueError(f"Pipeline cycle at stage {name!r}")
+
+        stage = by_name[name]
+        inputs = {d: _run(d, path + (name,)) for d in stage.deps}
+
+        cfg_hash = config_hash(cfg, stage.config)
+        cached = None if name in stale else _load_output(stage_dir, name, cfg_hash)
+        if cached is not None and stage.memo:
+            out = cached
+        else:
+            logging.info("Pipeline: recording_id=%s stage=%s", recording_id, name)
+            out = stage.fn(ctx, inputs)
+            if out != cached:
+                _save_output(stage_dir, name, out, cfg_hash)
+                # Anything memoized below this stage was built from the old output
+                stale.update(_downstream(by_name, [name]))
+        ctx.outputs[name] = out
+        return out
+
+    for name in targets or [s.name for s in stages]:
+        _run(name)
+    return ctx.outputs
@@ -0,0 +1,261 @@
+import os
+import re
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from infrastructure.storage import recording_plots_dir, recording_stage_dir
+from repositories.db import release_pinned_connection
+from repositories.recording_repo import get_signal_path
+from services.signal_service import filtered_signal_info, open_filtered
+from signal_processing.wfdb_io import load_leads_from_raw_dir
+from signal_processing.plots import save_time_plot, save_spectrum_plot, save_spectrum_plot_db
+
+# <recording_id>/time_lead0.png, <recording_id>/freq_lead3.png
+PLOT_NAME_RE = re.compile(r"^(\d+)/(time|freq)_lead(\d+)\.png$")
+
+_LOCK_DIR = ".locks"
+
+# PLOTS_DIR size as last counted by this process, plus what it rendered since.
+# Other processes render too, so it is recounted every EVICT_RESCAN_RENDERS renders.
+EVICT_RESCAN_RENDERS = 50
+_cache_lock = threading.Lock()
+_cache_state = {"bytes": None, "renders": 0}
+
+
+def lead_plot_paths(cfg, recording_id: int, lead_index: int) -> tuple[str, str]:
+    plots_dir = recording_plots_dir(cfg, recording_id)
+    return (
+        os.path.join(plots_dir, f"time_lead{lead_index}.png"),
+        os.path.join(plots_dir, f"freq_lead{lead_index}.png"),
+    )
+
+
+def parse_plot_name(filename: str):
+    """(recording_id, kind, lead_index) for a lazily rendered plot, else None."""
+    m = PLOT_NAME_RE.match(filename)
+    if not m:
+        return None
+    return int(m.group(1)), m.group(2), int(m.group(3))
+
+
+def plot_version(meta: dict | None):
+    """
+    Identifies one rendering of a recording's plots: pipeline version + the
+    render_id written by the plots stage. None for recordings from before that.
+    """
+    if not meta or not meta.get("pipeline_version") or not meta.get("render_id"):
+        return None
+    return f"{meta['pipeline_version']}-{meta['render_id']}"
+
+
+def plot_etag(recording_id: int, version: str, name: str) -> str:
+    """Strong ETag of one plot/thumbnail file (name e.g. "time_lead0.png")."""
+    return f"{recording_id}-{version}-{name}"
+
+
+def thumbnail_path(cfg, recording_id: int, meta: dict, fmt: str = "png"):
+    """The worker-made thumbnail (thumb.png / thumb.webp), None if there is none."""
+    version = (meta or {}).get("pipeline_version")
+    if not version:
+        return None
+    path = os.path.join(recording_stage_dir(cfg, recording_id, version), f"thumb.{fmt}")
+    return path if os.path.isfile(path) else None
+
+
+def _stored_psd(cfg, recording_id: int, info: dict):
+    """psd.npz of the pipeline's PSD stage, if this recording has one."""
+    version = info.get("pipeline_version")
+    if not version:
+        return None
+    path = os.path.join(recording_stage_dir(cfg, recording_id, version), "psd.npz")
+    return path if os.path.isfile(path) else None
+
+
+def _render(cfg, recording_id: int, kind: str, lead_index: int, path: str):
+    """Renders one plot from the stored filtered signal (+ the raw window for comparison)."""
+    info = filtered_signal_info(cfg, recording_id)
+    if not 0 <= lead_index < len(info["leads"]):
+        raise FileNotFoundError(f"No lead {lead_index} in recording {recording_id}")
+
+    lead = info["leads"][lead_index]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".part.png"
+
+    # Spectrum already computed by the pipeline: no signal I/O or FFT needed
+    psd_path = _stored_psd(cfg, recording_id, info) if kind == "freq" else None
+    if psd_path:
+        release_pinned_connection()  # no pool slot held while matplotlib renders
+        with np.load(psd_path) as psd:
+            save_spectrum_plot_db(
+                tmp,
+                psd["freqs"],
+                psd["raw_db"][lead_index],
+                psd["filtered_db"][lead_index],
+                title=f"Spectrum lead {lead}: Raw vs Filtered ECG",
+            )
+        os.replace(tmp, path)
+        return
+
+    fs = info["fs"]
+    n = min(info["n_samples"], max(1, int(cfg.get("PLOT_WINDOW_SECONDS", 300) * fs)))
+    filtered = np.array(open_filtered(info["path"])[lead_index, :n])
+
+    raw_row = get_signal_path(cfg, recording_id, "raw")
+    if not raw_row or not raw_row.get("file_path"):
+        raise FileNotFoundError(f"Missing raw signal for recording {recording_id}")
+    release_pinned_connection()
+    channels = info.get("channels") or list(range(len(info["leads"])))
+    raw, _, _ = load_leads_from_raw_dir(
+        os.path.dirname(raw_row["file_path"]),
+        record_name=os.path.basename(raw_row["file_path"]),
+        channels=[channels[lead_index]],
+        sampto=n,
+    )
+
+    if kind == "time":
+        save_time_plot(tmp, raw[0], filtered, fs, title=f"ECG lead {lead}: Raw vs Filtered")
+    else:
+        save_spectrum_plot(tmp, raw[0], filtered, fs, title=f"Spectrum lead {lead}: Raw vs Filtered ECG")
+    os.replace(tmp, path)
+
+
+def ensure_plot(cfg, recording_id: int, kind: str, lead_index: int) -> str:
+    """
+    Path of the rendered plot, rendering it on first request.
+
+    Single-flight: an exclusive flock per plot means concurrent requests (any
+    thread or process) wait for the one render instead of repeating it.
+    A cache hit only refreshes the file's mtime, which drives LRU eviction.
+    """
+    time_path, freq_path = lead_plot_paths(cfg, recording_id, lead_index)
+    path = time_path if kind == "time" else freq_path
+
+    if os.path.isfile(path):
+        _touch(path)
+        return path
+
+    lock_dir = os.path.join(cfg["PLOTS_DIR"], _LOCK_DIR)
+    lock_path = os.path.join(lock_dir, f"{recording_id}_{kind}_lead{lead_index}.lock")
+
+    with _render_lock(lock_path):
+        if not os.path.isfile(path):  # somebody else may have rendered it while we waited
+            _render(cfg, recording_id, kind, lead_index, path)
+            _note_render(cfg, path)
+    return path
+
+
+@contextmanager
+def _render_lock(lock_path: str):
+    """
+    Exclusive flock on lock_path; the file is removed again on release.
+    A waiter that got the lock on an already removed file retries on the new one.
+    """
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    while True:
+        lock = open(lock_path, "a")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.stat(lock_path).st_ino == os.fstat(lock.fileno()).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        lock.close()
+
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_path)  # while still holding it, see above
+        except OSError:
+            pass
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
+
+
+def invalidate_plots(cfg, recording_id: int):
+    """Drops rendered plots of a recording (e.g. after reprocessing)."""
+    plots_dir = recording_plots_dir(cfg, recording_id)
+    if not os.path.isdir(plots_dir):
+        return
+    for name in os.listdir(plots_dir):
+        if name.endswith(".png"):
+            try:
+                os.remove(os.path.join(plots_dir, name))
+            except OSError:
+                pass
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _note_render(cfg, path: str):
+    """Counts a new plot; only walks PLOTS_DIR when the cache may be over its limit."""
+    max_bytes = int(cfg.get("PLOT_CACHE_MAX_MB", 500) * 1024 * 1024)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+
+    with _cache_lock:
+        _cache_state["renders"] += 1
+        if _cache_state["bytes"] is not None:
+            _cache_state["bytes"] += size
+        due = (
+            _cache_state["bytes"] is None
+            or _cache_state["bytes"] > max_bytes
+            or _cache_state["renders"] >= EVICT_RESCAN_RENDERS
+        )
+    if due:
+        evict_plots(cfg, keep=path)
+
+
+def evict_plots(cfg, keep: str | None = None):
+    """
+    Keeps the lazily rendered plots (PLOT_NAME_RE) under PLOT_CACHE_MAX_MB by
+    deleting the least recently used (oldest mtime first). Evicted plots are
+    re-rendered on demand; other files in PLOTS_DIR are neither counted nor touched.
+    """
+    max_bytes = int(cfg.get("PLOT_CACHE_MAX_MB", 500) * 1024 * 1024)
+    root = cfg["PLOTS_DIR"]
+
+    files = []
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != _LOCK_DIR]
+        for name in filenames:
+            full = os.path.join(dirpath, name)
+            # Only plots ensure_plot can render again; legacy <id>_time.png files are not
+            if not parse_plot_name(os.path.relpath(full, root).replace(os.sep, "/")):
+                continue
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, full))
+            total += st.st_size
+
+    if total > max_bytes:
+        files.sort()
+        for _, size, full in files:
+            if total <= max_bytes:
+                break
+            if full == keep:
+                continue
+            try:
+                os.remove(full)
+                total -= size
+            except OSError:
+                pass
+        logging.info("Plot cache evicted down to %.1f MB", total / 1024 / 1024)
+
+    with _cache_lock:
+        _cache_state["bytes"] = total
+        _cache_state["renders"] = 0
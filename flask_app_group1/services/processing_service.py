@@ -1,16 +1,72 @@
 import os
+import uuid
+import shutil
 import numpy as np
 
+from infrastructure.storage import (
+    recording_filtered_path,
+    recording_envelope_dir,
+    recording_stage_dir,
+    write_recording_meta,
+)
 from repositories.recording_repo import get_signal_path
-from signal_processing.wfdb_io import load_from_raw_dir
+from services.pipeline import Stage, run_stages
+from services.plot_service import lead_plot_paths, invalidate_plots
+from signal_processing.wfdb_io import read_record_info, iter_lead_windows, load_leads_from_raw_dir
 from signal_processing.filters import filter_ecg
-from signal_processing.plots import save_time_plot, save_spectrum_plot
-from signal_processing.features import detect_sudden_hr_change
+from signal_processing.envelope import build_envelope_pyramid
+from signal_processing.plots import magnitude_spectrum_db, save_thumbnail
+from signal_processing.features import (
+    qrs_energy,
+    r_peak_candidates,
+    r_peak_threshold,
+    merge_peak_chunks,
+    hrv_features,
+    feature_summary,
+    signal_too_short,
+)
 
+# Stamped on ecg.pipeline_version when a worker claims a recording.
+# Also keys the memoized stage outputs: bump it when a stage changes its output.
+PIPELINE_VERSION = "v3"
 
-def process_recording(cfg, recording_id: int) -> dict:
-    # --- locate raw signal ---
-    raw_row = get_signal_path(cfg, recording_id, "raw")
+
+# Energy values per lead the R-peak threshold is estimated from (strided above this)
+PEAK_THRESHOLD_SAMPLES = 250_000
+
+
+def _windows(n_samples: int, chunk_samples: int, overlap_samples: int):
+    """(start, stop, lo, hi) per chunk; [lo, hi) is the chunk plus overlap on both sides."""
+    for start in range(0, n_samples, chunk_samples):
+        stop = min(start + chunk_samples, n_samples)
+        yield start, stop, max(0, start - overlap_samples), min(n_samples, stop + overlap_samples)
+
+
+def _chunking(cfg, fs):
+    chunk_samples = max(1, int(cfg.get("PROCESSING_CHUNK_SECONDS", 300) * fs))
+    overlap_samples = int(cfg.get("PROCESSING_OVERLAP_SECONDS", 10) * fs)
+    return chunk_samples, overlap_samples
+
+
+def _open_part(path: str, shape):
+    # Written as <name>.part.npy and renamed when complete
+    tmp = path[:-len(".npy")] + ".part.npy"
+    return tmp, np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=shape)
+
+
+# --------------------------
+# Stages
+# --------------------------
+# Signal stages work chunk by chunk (PROCESSING_CHUNK_SECONDS, with
+# PROCESSING_OVERLAP_SECONDS of context on both sides that is cut off again),
+# so peak memory is bounded by the chunk size and not the recording length.
+
+def stage_load(ctx, inputs):
+    """
+    Header only: where the record is, its length, fs and leads (all, or ECG_CHANNELS).
+    Not memoized; the raw files' size/mtime make a changed upload redo all stages.
+    """
+    raw_row = get_signal_path(ctx.cfg, ctx.recording_id, "raw")
     if not raw_row or not raw_row.get("file_path"):
         raise RuntimeError("Missing raw signal file_path")
 
@@ -18,46 +74,283 @@ def process_recording(cfg, recording_id: int) -> dict:
     raw_dir = os.path.dirname(raw_base)      # /.../raw/11
     record_name = os.path.basename(raw_base) # rec_3
 
-    # --- load raw ECG ---
-    ecg, fs = load_from_raw_dir(
-        raw_dir,
-        record_name=record_name,
-        channel=0,
+    fs, n_samples, lead_names = read_record_info(raw_dir, record_name)
+    channels = ctx.cfg.get("ECG_CHANNELS")
+    if channels:
+        lead_names = [lead_names[c] for c in channels]
+
+    raw_files = sorted(
+        name for name in os.listdir(raw_dir)
+        if os.path.splitext(name)[0] == record_name
     )
+    fingerprint = []
+    for name in raw_files:
+        st = os.stat(os.path.join(raw_dir, name))
+        fingerprint.append([name, st.st_size, st.st_mtime_ns])
+
+    return {
+        "raw_dir": raw_dir,
+        "record_name": record_name,
+        "raw_fingerprint": fingerprint,
+        "fs": float(fs),
+        "n_samples": int(n_samples),
+        "leads": list(lead_names),
+        "channels": list(channels or range(len(lead_names))),
+    }
 
-    # --- filtering ---
-    ecg_f = filter_ecg(ecg, fs)
 
-    # --- save filtered signal ---
-    filtered_path = os.path.join(cfg["FILTERED_DIR"], f"{recording_id}.npy")
-    os.makedirs(os.path.dirname(filtered_path), exist_ok=True)
-    np.save(filtered_path, ecg_f)
+def stage_filter(ctx, inputs):
+    """Filtered signal (n_leads, n_samples) float32 in FILTERED_DIR/<id>.npy."""
+    rec = inputs["load"]
+    fs, n = rec["fs"], rec["n_samples"]
+    chunk_samples, overlap_samples = _chunking(ctx.cfg, fs)
+    notch_hz = ctx.cfg.get("ECG_NOTCH_HZ", 50.0)
 
-    # --- plots ---
-    time_plot_path = os.path.join(cfg["PLOTS_DIR"], f"{recording_id}_time.png")
-    freq_plot_path = os.path.join(cfg["PLOTS_DIR"], f"{recording_id}_freq.png")
+    path = recording_filtered_path(ctx.cfg, ctx.recording_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp, out = _open_part(path, (len(rec["leads"]), n))
 
-    save_time_plot(
-        path=time_plot_path,
-        raw=ecg,
-        filtered=ecg_f,
-        fs=fs,
+    for start, stop, lo, raw in iter_lead_windows(
+        rec["raw_dir"],
+        rec["record_name"],
+        n,
+        chunk_samples,
+        overlap_samples,
+        channels=rec["channels"],
+    ):
+        # All leads in one vectorized call
+        filt = filter_ecg(raw, fs, notch_hz=notch_hz)
+        out[:, start:stop] = filt[:, start - lo:stop - lo]
+
+    out.flush()
+    del out
+    os.replace(tmp, path)
+    return {"path": path, "files": [path]}
+
+
+def stage_peaks(ctx, inputs):
+    """
+    R-peak sample indices per lead (peaks.npz, key lead<i>).
+
+    The QRS-enhanced energy they are picked from is computed per chunk and not
+    kept. One threshold per lead for the whole recording, as for a single
+    window: candidates are collected per chunk and cut at the 95th percentile
+    of a strided sample of the energy (every sample up to PEAK_THRESHOLD_SAMPLES).
+    """
+    rec = inputs["load"]
+    fs, n = rec["fs"], rec["n_samples"]
+    chunk_samples, overlap_samples = _chunking(ctx.cfg, fs)
+
+    filtered = np.load(inputs["filter"]["path"], mmap_mode="r")
+    n_leads = filtered.shape[0]
+    stride = -(-n // PEAK_THRESHOLD_SAMPLES)
+    candidates = [[] for _ in range(n_leads)]
+    heights = [[] for _ in range(n_leads)]
+    sample = []
+
+    for start, stop, lo, hi in _windows(n, chunk_samples, overlap_samples):
+        energy = qrs_energy(np.asarray(filtered[:, lo:hi], dtype=float), fs)
+        a, b = start - lo, stop - lo
+        # Same sample positions (multiples of stride) whatever the chunking
+        sample.append(energy[:, a + (-start) % stride:b:stride])
+        for i in range(n_leads):
+            # Peaks in the overlap belong to the neighbouring chunk
+            peaks, h = r_peak_candidates(energy[i], fs)
+            inside = (peaks >= a) & (peaks < b)
+            candidates[i].append(peaks[inside] + lo)
+            heights[i].append(h[inside])
+
+    sample = np.concatenate(sample, axis=1)
+    lead_peaks = {}
+    for i in range(n_leads):
+        thresh = r_peak_threshold(sample[i])
+        lead_peaks[f"lead{i}"] = merge_peak_chunks(
+            [p[h >= thresh] for p, h in zip(candidates[i], heights[i])], fs
+        )
+
+    path = os.path.join(ctx.stage_dir, "peaks.npz")
+    np.savez(path, **lead_peaks)
+    return {"path": path, "files": [path]}
+
+
+def stage_envelope(ctx, inputs):
+    """Min/max envelope pyramid (1/4, 1/16, 1/64, ... of the samples) for zoomable viewing."""
+    levels = build_envelope_pyramid(
+        np.load(inputs["filter"]["path"], mmap_mode="r"),
+        recording_envelope_dir(ctx.cfg, ctx.recording_id),
     )
+    return {"levels": levels}
 
-    save_spectrum_plot(
-        path=freq_plot_path,
-        raw=ecg,
-        filtered=ecg_f,
-        fs=fs,
+
+def stage_psd(ctx, inputs):
+    """
+    Magnitude spectra (dB) of raw and filtered over the plot window
+    (first PLOT_WINDOW_SECONDS); plot_service draws the spectrum plots from these.
+    """
+    rec = inputs["load"]
+    fs = rec["fs"]
+    n = min(rec["n_samples"], max(1, int(ctx.cfg.get("PLOT_WINDOW_SECONDS", 300) * fs)))
+
+    raw, _, _ = load_leads_from_raw_dir(
+        rec["raw_dir"],
+        record_name=rec["record_name"],
+        channels=rec["channels"],
+        sampto=n,
     )
+    filtered = np.load(inputs["filter"]["path"], mmap_mode="r")[:, :n]
+
+    freqs, raw_db = magnitude_spectrum_db(raw, fs)
+    _, filtered_db = magnitude_spectrum_db(filtered, fs)
+
+    # New file + rename: the old one may be hard-linked to a duplicate upload
+    path = os.path.join(ctx.stage_dir, "psd.npz")
+    tmp = path[:-len(".npz")] + ".part.npz"
+    np.savez(
+        tmp,
+        freqs=freqs,
+        raw_db=raw_db.astype(np.float32),
+        filtered_db=filtered_db.astype(np.float32),
+    )
+    os.replace(tmp, path)
+    return {"path": path, "files": [path]}
+
+
+def stage_features(ctx, inputs):
+    """
+    HR-change flag + HRV summary per lead, from the shared peaks.
+    Only the scalar summary is kept; the per-beat series can be recomputed from peaks.npz.
+    """
+    rec = inputs["load"]
+    fs = rec["fs"]
+
+    per_lead = []
+    with np.load(inputs["peaks"]["path"]) as peaks:
+        for i in range(len(rec["leads"])):
+            if signal_too_short(rec["n_samples"], fs):
+                per_lead.append({
+                    "sudden_hr_change": False,
+                    "note": "signal too short for HR change detection",
+                })
+            else:
+                per_lead.append(feature_summary(hrv_features(peaks[f"lead{i}"], fs)))
+
+    return {
+        "sudden_hr_change": any(f["sudden_hr_change"] for f in per_lead),
+        "leads": [dict(lead=lead, **f) for lead, f in zip(rec["leads"], per_lead)],
+    }
+
+
+def stage_thumbnail(ctx, inputs):
+    """
+    Small preview (first PLOT_THUMB_SECONDS of lead 0) for listings, as PNG
+    and, if PLOT_THUMB_WEBP and Pillow supports it, WebP.
+    """
+    rec = inputs["load"]
+    fs = rec["fs"]
+    n = min(rec["n_samples"], max(1, int(ctx.cfg.get("PLOT_THUMB_SECONDS", 10) * fs)))
+    lead0 = np.asarray(np.load(inputs["filter"]["path"], mmap_mode="r")[0, :n], dtype=float)
+
+    # New files + rename: the old ones may be hard-linked to a duplicate upload
+    png = os.path.join(ctx.stage_dir, "thumb.png")
+    webp = os.path.join(ctx.stage_dir, "thumb.webp")
+    png_tmp, webp_tmp = png + ".part", webp + ".part"
+    has_webp = save_thumbnail(
+        png_tmp,
+        lead0,
+        fs,
+        webp_path=webp_tmp if ctx.cfg.get("PLOT_THUMB_WEBP", True) else None,
+    )
+    os.replace(png_tmp, png)
+    if has_webp:
+        os.replace(webp_tmp, webp)
+    elif os.path.exists(webp):
+        os.remove(webp)
+
+    files = [png, webp] if has_webp else [png]
+    return {"png": png, "webp": webp if has_webp else None, "files": files}
+
+
+def stage_plots(ctx, inputs):
+    """
+    Publishes the viewer metadata and the plot paths.
+    Plots are NOT rendered here; plot_service renders them on first view.
+    """
+    rec = inputs["load"]
+    write_recording_meta(ctx.cfg, ctx.recording_id, {
+        "fs": rec["fs"],
+        "leads": rec["leads"],
+        "channels": rec["channels"],
+        "n_samples": rec["n_samples"],
+        "envelope_levels": inputs["envelope"]["levels"],
+        "pipeline_version": PIPELINE_VERSION,
+        # New id per (re)run: part of the plots' ETag and cache-busting URLs
+        "render_id": uuid.uuid4().hex[:12],
+    })
+
+    # Drop any plots rendered from a previous run
+    invalidate_plots(ctx.cfg, ctx.recording_id)
+    plots = []
+    for i, lead in enumerate(rec["leads"]):
+        time_plot_path, freq_plot_path = lead_plot_paths(ctx.cfg, ctx.recording_id, i)
+        plots.append({"lead": lead, "time": time_plot_path, "freq": freq_plot_path})
+    return {"plots": plots}
+
+
+# cfg keys per stage: a change redoes that stage and everything below it
+_CHUNK_CONFIG = ("PROCESSING_CHUNK_SECONDS", "PROCESSING_OVERLAP_SECONDS")
+
+STAGES = [
+    Stage("load", stage_load, memo=False, config=("ECG_CHANNELS",)),
+    Stage("filter", stage_filter, deps=("load",), config=("ECG_NOTCH_HZ",) + _CHUNK_CONFIG),
+    Stage("peaks", stage_peaks, deps=("load", "filter"), config=_CHUNK_CONFIG),
+    Stage("envelope", stage_envelope, deps=("filter",)),
+    Stage("psd", stage_psd, deps=("load", "filter"), config=("PLOT_WINDOW_SECONDS",)),
+    Stage("features", stage_features, deps=("load", "peaks")),
+    Stage("thumbnail", stage_thumbnail, deps=("load", "filter"), config=("PLOT_THUMB_SECONDS", "PLOT_THUMB_WEBP")),
+    # plots after thumbnail: a new thumbnail also gets a new render_id (ETag)
+    Stage("plots", stage_plots, deps=("load", "envelope", "psd", "thumbnail")),
+]
+
+
+def stage_dir(cfg, recording_id: int) -> str:
+    return recording_stage_dir(cfg, recording_id, PIPELINE_VERSION)
+
+
+def _remove_old_stage_dirs(cfg, recording_id: int):
+    # Memos of other pipeline versions are never read again once this one is complete
+    current = stage_dir(cfg, recording_id)
+    parent = os.path.dirname(current)
+    for name in os.listdir(parent):
+        path = os.path.join(parent, name)
+        if path != current and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def run_pipeline(cfg, recording_id: int, targets=None, force=()) -> dict:
+    """
+    Runs (part of) the stage graph for one recording, see services.pipeline.run_stages.
+    e.g. run_pipeline(cfg, 7, force=("peaks",)) re-detects the peaks and
+    recomputes the features, reusing the memoized load/filter outputs.
+    """
+    return run_stages(cfg, recording_id, STAGES, stage_dir(cfg, recording_id), targets=targets, force=force)
+
 
-    # --- feature extraction / flags ---
-    flags = detect_sudden_hr_change(ecg_f, fs)
+def process_recording(cfg, recording_id: int, force=()) -> dict:
+    """
+    Full pipeline for one recording. Stage outputs are memoized per recording
+    and PIPELINE_VERSION, so a retried job only redoes the stages that are missing.
+    """
+    out = run_pipeline(cfg, recording_id, force=force)
+    _remove_old_stage_dirs(cfg, recording_id)
+    rec = out["load"]
+    plots = out["plots"]["plots"]
 
     return {
-        "filtered_path": filtered_path,
-        "time_plot_path": time_plot_path,
-        "freq_plot_path": freq_plot_path,
-        "fs": fs,
-        "flags": flags,
+        "filtered_path": out["filter"]["path"],
+        "time_plot_path": plots[0]["time"] if plots else None,
+        "freq_plot_path": plots[0]["freq"] if plots else None,
+        "plots": plots,
+        "leads": rec["leads"],
+        "fs": rec["fs"],
+        "flags": out["features"],
     }
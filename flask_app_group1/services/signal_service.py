@@ -0,0 +1,173 @@
+import os
+import math
+import numpy as np
+
+from infrastructure.storage import recording_filtered_path, recording_envelope_dir, read_recording_meta
+from signal_processing.envelope import level_path, pick_level
+from repositories.recording_repo import get_signal_path
+
+
+class SignalNotAvailable(LookupError):
+    pass
+
+
+def filtered_signal_info(cfg, recording_id: int) -> dict:
+    """
+    fs / lead names / length of the stored filtered signal.
+    Falls back to the DB row for recordings processed before the JSON sidecar.
+    """
+    path = recording_filtered_path(cfg, recording_id)
+    if not os.path.isfile(path):
+        raise SignalNotAvailable(f"No filtered signal for recording {recording_id}")
+
+    meta = read_recording_meta(cfg, recording_id)
+    if meta:
+        return dict(meta, path=path)
+
+    row = get_signal_path(cfg, recording_id, "filtered")
+    if not row or not row.get("sample_rate"):
+        raise SignalNotAvailable(f"Unknown sample rate for recording {recording_id}")
+
+    data = open_filtered(path)
+    return {
+        "fs": float(row["sample_rate"]),
+        "leads": [f"lead{i}" for i in range(data.shape[0])],
+        "n_samples": int(data.shape[-1]),
+        "path": path,
+    }
+
+
+def open_filtered(path: str):
+    """
+    Memory-maps the filtered .npy: nothing is read until it is sliced,
+    and then only the pages of the requested samples.
+    Always returns shape (n_leads, n_samples) (old files are 1D).
+    """
+    data = np.load(path, mmap_mode="r")
+    return data.reshape(1, -1) if data.ndim == 1 else data
+
+
+def resolve_lead(info: dict, lead) -> int:
+    """Lead given as index ("1") or name ("V1")."""
+    leads = info["leads"]
+    if lead is None or lead == "":
+        return 0
+    if str(lead).isdigit():
+        idx = int(lead)
+    elif lead in leads:
+        idx = leads.index(lead)
+    else:
+        raise ValueError(f"Unknown lead {lead!r}")
+    if not 0 <= idx < len(leads):
+        raise ValueError(f"Lead index {idx} out of range")
+    return idx
+
+
+def read_signal_window(cfg, recording_id: int, start_s: float, duration_s: float, lead=None) -> dict:
+    """
+    Returns `duration_s` seconds of one lead of the filtered signal, starting at `start_s`.
+    A 10 s window of a 24 h recording only touches ~10 s worth of file pages.
+    """
+    if not (math.isfinite(start_s) and math.isfinite(duration_s)):
+        raise ValueError("start and duration must be finite numbers")
+    if start_s < 0 or duration_s <= 0:
+        raise ValueError("start must be >= 0 and duration > 0")
+
+    max_s = cfg.get("SIGNAL_WINDOW_MAX_SECONDS", 300)
+    if duration_s > max_s:
+        raise ValueError(f"duration must be <= {max_s} s")
+
+    info = filtered_signal_info(cfg, recording_id)
+    idx = resolve_lead(info, lead)
+    fs = info["fs"]
+
+    data = open_filtered(info["path"])
+    n = data.shape[-1]
+    lo = min(int(round(start_s * fs)), n)
+    hi = min(lo + int(round(duration_s * fs)), n)
+
+    # np.array copies just this slice out of the memmap
+    samples = np.array(data[idx, lo:hi], dtype=np.float32)
+
+    return {
+        "recording_id": recording_id,
+        "lead": info["leads"][idx],
+        "lead_index": idx,
+        "fs": fs,
+        "start_sample": lo,
+        "start": lo / fs,
+        "duration": (hi - lo) / fs,
+        "n_samples_total": n,
+        "samples": samples,
+    }
+
+
+def read_envelope_window(cfg, recording_id: int, start_s: float = 0.0, duration_s: float | None = None, lead=None, pixels: int = 1000) -> dict:
+    """
+    Min/max envelope of one lead for a time window, at about one bin per pixel.
+
+    Uses the coarsest pyramid level that still has >= `pixels` bins in the
+    window, so the amount of data read is ~pixels..4*pixels bins no matter
+    how long the window (or the recording) is. Short windows get the raw
+    samples (min == max).
+    """
+    if not math.isfinite(start_s) or (duration_s is not None and not math.isfinite(duration_s)):
+        raise ValueError("start and duration must be finite numbers")
+    if start_s < 0 or (duration_s is not None and duration_s <= 0):
+        raise ValueError("start must be >= 0 and duration > 0")
+    if not 1 <= pixels <= 20000:
+        raise ValueError("pixels must be between 1 and 20000")
+
+    info = filtered_signal_info(cfg, recording_id)
+    idx = resolve_lead(info, lead)
+    fs = info["fs"]
+    n = info["n_samples"]
+
+    lo = min(int(round(start_s * fs)), n)
+    hi = n if duration_s is None else min(lo + int(round(duration_s * fs)), n)
+
+    level = pick_level(info.get("envelope_levels") or [], hi - lo, pixels)
+    if level is None:
+        samples = np.array(open_filtered(info["path"])[idx, lo:hi], dtype=np.float32)
+        bin_samples = 1
+        bin_lo = lo
+        env_min = env_max = samples
+    else:
+        bin_samples = level["bin_samples"]
+        bin_lo = lo // bin_samples
+        bin_hi = -(-hi // bin_samples)
+        env = np.load(level_path(recording_envelope_dir(cfg, recording_id), level["level"]), mmap_mode="r")
+        block = np.array(env[idx, bin_lo:bin_hi], dtype=np.float32)
+        env_min, env_max = block[:, 0], block[:, 1]
+
+    return {
+        "recording_id": recording_id,
+        "lead": info["leads"][idx],
+        "lead_index": idx,
+        "fs": fs,
+        "start": bin_lo * bin_samples / fs,
+        "bin_seconds": bin_samples / fs,
+        "level": level["level"] if level else 0,
+        "min": env_min,
+        "max": env_max,
+    }
+
+
+def encode_samples(values, fmt: str = "int16"):
+    """
+    Packs samples little-endian for the binary waveform endpoint.
+
+    int16: values = q * scale (2 bytes/sample, ~1/32767 of full range precision)
+    float32: values as-is (scale 1.0)
+    Returns (payload bytes, scale).
+    """
+    values = np.asarray(values, dtype=np.float32)
+    if fmt == "float32":
+        return values.astype("<f4").tobytes(), 1.0
+    if fmt != "int16":
+        raise ValueError("format must be int16 or float32")
+
+    peak = float(np.max(np.abs(values))) if values.size else 0.0
+    scale = peak / 32767.0 if peak > 0 else 1.0
+    q = np.round(values / scale).astype("<i2")
+    return q.tobytes(), scale
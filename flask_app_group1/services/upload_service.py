@@ -1,8 +1,54 @@
 import os
 import re
-from infrastructure.storage import recording_raw_dir
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import tarfile
+import zipfile
+import hashlib
+import logging
+import threading
+from infrastructure.storage import (
+    recording_raw_dir,
+    recording_filtered_path,
+    save_stream_hashed,
+    store_content,
+    link_recording_outputs,
+    remove_recording_outputs,
+)
+from infrastructure.wakeup import notify_workers
+from repositories.db import transaction, release_pinned_connection
 from repositories.patient_repo import get_patient_by_user_id
-from repositories.recording_repo import create_recording, upsert_signal_path, set_status
+from repositories.recording_repo import (
+    create_recording,
+    create_recordings_bulk,
+    upsert_signal_path,
+    upsert_signal_paths,
+    set_status,
+    set_status_many,
+    set_content_hash,
+    find_processed_duplicate,
+    find_processed_duplicates,
+)
+from repositories.feature_repo import copy_recording_features, copy_recording_features_many
+from services.plot_service import lead_plot_paths
+from services.processing_service import PIPELINE_VERSION
+
+UPLOAD_KINDS = (".dat", ".hea")
+
+
+class UploadNotFound(LookupError):
+    pass
+
+
+class UploadOffsetMismatch(Exception):
+    """A chunk was sent for another offset than the number of bytes received so far."""
+
+    def __init__(self, received: int):
+        super().__init__(f"Expected offset {received}")
+        self.received = received
 
 
 def _safe_stem(filename: str) -> str:
@@ -13,6 +59,20 @@ def _safe_stem(filename: str) -> str:
     return stem or "rec"
 
 
+def _record_name(dat_filename: str | None, hea_filename: str | None) -> str:
+    # Use the base name from the uploaded files (must match the .hea internal reference)
+    dat_stem = _safe_stem(dat_filename or "rec.dat")
+    hea_stem = _safe_stem(hea_filename or "rec.hea")
+    if dat_stem != hea_stem:
+        # If user uploads mismatched pair, fail early
+        raise ValueError(f"Mismatched WFDB pair: {dat_stem}.dat vs {hea_stem}.hea")
+    return dat_stem  # e.g. "rec_3"
+
+
+def _max_upload_bytes(cfg) -> int:
+    return int(cfg.get("UPLOAD_MAX_MB", 1024) * 1024 * 1024)
+
+
 def handle_patient_upload(cfg, user_id: int, dat_file, hea_file) -> int:
     if not dat_file or not hea_file:
         raise ValueError("Missing .dat or .hea")
@@ -21,31 +81,529 @@ def handle_patient_upload(cfg, user_id: int, dat_file, hea_file) -> int:
     if not patient:
         raise RuntimeError("No patient linked to this user_id")
 
+    record_name = _record_name(dat_file.filename, hea_file.filename)
     recording_id = create_recording(cfg, patient_id=patient["patient_id"], uploaded_by=user_id)
+    # No pool slot held while the files stream in
+    release_pinned_connection()
 
     try:
         rec_dir = recording_raw_dir(cfg, recording_id)
-        os.makedirs(rec_dir, exist_ok=True)
-
-        # Use the base name from the uploaded files (must match the .hea internal reference)
-        dat_stem = _safe_stem(dat_file.filename or "rec.dat")
-        hea_stem = _safe_stem(hea_file.filename or "rec.hea")
-        if dat_stem != hea_stem:
-            # If user uploads mismatched pair, fail early
-            raise ValueError(f"Mismatched WFDB pair: {dat_stem}.dat vs {hea_stem}.hea")
-
-        record_name = dat_stem  # e.g. "rec_3"
         base_path = os.path.join(rec_dir, record_name)
 
-        dat_path = base_path + ".dat"
-        hea_path = base_path + ".hea"
-
-        dat_file.save(dat_path)
-        hea_file.save(hea_path)
+        # Hash while writing (size-capped)
+        parts = {}
+        for ext, f in ((".dat", dat_file), (".hea", hea_file)):
+            tmp = base_path + ext + ".part"
+            parts[ext] = (tmp, save_stream_hashed(f.stream, tmp, max_bytes=_max_upload_bytes(cfg)))
 
-        upsert_signal_path(cfg, recording_id, "raw", base_path, sample_rate=None)
+        _register_raw(cfg, recording_id, record_name, parts)
         return recording_id
 
     except Exception as e:
         set_status(cfg, recording_id, "FAILED", error_message=str(e))
         raise
+
+
+def _content_hash(parts: dict) -> str:
+    # Identity of a WFDB recording: both files
+    return hashlib.sha256(f"{parts['.dat'][1]}:{parts['.hea'][1]}".encode()).hexdigest()
+
+
+def _register_raw(cfg, recording_id: int, record_name: str, parts: dict):
+    """
+    Moves the received files (parts: {".dat": (path, sha256), ".hea": ...}) into
+    the content store, links them into RAW_DIR/<id>/ and queues the recording,
+    unless an identical recording can be reused.
+    """
+    base_path = os.path.join(recording_raw_dir(cfg, recording_id), record_name)
+
+    # Identical content is stored once and hard-linked
+    for ext, (path, digest) in parts.items():
+        store_content(cfg, path, digest, base_path + ext)
+
+    content_hash = _content_hash(parts)
+    set_content_hash(cfg, recording_id, content_hash)
+
+    # Same recording already processed by this pipeline version -> reuse, skip the worker
+    if _reuse_processed(cfg, recording_id, base_path, content_hash):
+        return
+
+    upsert_signal_path(cfg, recording_id, "raw", base_path, sample_rate=None)
+
+    # Raw file is registered -> claimable; wake an idle worker right away
+    notify_workers(cfg)
+
+
+def _reuse_processed(cfg, recording_id: int, raw_base: str, content_hash: str) -> bool:
+    """
+    Links the outputs of an identical, already processed recording and marks
+    this one DONE. Returns False (-> normal queueing) if there is none or linking fails.
+    """
+    dup = find_processed_duplicate(cfg, content_hash, PIPELINE_VERSION, exclude_id=recording_id)
+    if not dup or not _link_duplicate(cfg, dup, recording_id):
+        return False
+
+    # Raw + filtered + plots + features + DONE together: never claimable by a worker in between
+    with transaction(cfg):
+        upsert_signal_paths(cfg, _reused_signal_rows(cfg, recording_id, raw_base, dup))
+        copy_recording_features(cfg, dup["recording_id"], recording_id)
+        set_status(cfg, recording_id, "DONE", pipeline_version=PIPELINE_VERSION)
+
+    logging.info("Dedup: recording_id=%s reuses recording_id=%s", recording_id, dup["recording_id"])
+    return True
+
+
+def _link_duplicate(cfg, dup: dict, recording_id: int) -> bool:
+    """Links the duplicate's processed files to recording_id; False if that fails."""
+    try:
+        link_recording_outputs(cfg, dup["recording_id"], recording_id, PIPELINE_VERSION)
+        return True
+    except OSError:
+        logging.exception("Dedup: could not reuse outputs of recording_id=%s", dup["recording_id"])
+        remove_recording_outputs(cfg, recording_id)
+        return False
+
+
+def _reused_signal_rows(cfg, recording_id: int, raw_base: str, dup: dict) -> list[tuple]:
+    # ecg_signal rows of a recording that reuses `dup`'s outputs
+    time_plot_path, freq_plot_path = lead_plot_paths(cfg, recording_id, 0)
+    return [
+        (recording_id, "raw", raw_base, None),
+        (recording_id, "filtered", recording_filtered_path(cfg, recording_id), dup["sample_rate"]),
+        (recording_id, "time_plot", time_plot_path, None),
+        (recording_id, "freq_plot", freq_plot_path, None),
+    ]
+
+
+# --------------------------
+# Resumable chunked uploads
+# --------------------------
+# 1) start_upload_session: declares both files (name, size, optional sha256)
+# 2) write_upload_chunk: appends one chunk at the current offset; after a
+#    network error the client asks for the session status and continues
+#    from "received"
+# 3) complete_upload_session: checks sizes/checksums, then creates and
+#    queues the recording (nothing is queued before both files are complete)
+#
+# State lives in UPLOAD_INCOMING_DIR/<upload_id>/ (state.json + one file per
+# kind); the number of bytes received is simply the file size on disk.
+
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+# Bytes read from the request body per write (the protocol chunk is UPLOAD_CHUNK_BYTES)
+_STREAM_BLOCK = 64 * 1024
+
+# Running sha256 per (upload_id, kind) -> (offset, hasher); rebuilt from disk
+# if a chunk lands in another process or after a restart
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+def _session_dir(cfg, upload_id: str) -> str:
+    if not _UPLOAD_ID_RE.match(upload_id or ""):
+        raise UploadNotFound("Unknown upload")
+    return os.path.join(cfg["UPLOAD_INCOMING_DIR"], upload_id)
+
+
+def _part_path(session_dir: str, kind: str) -> str:
+    return os.path.join(session_dir, "data" + kind)
+
+
+def _write_state(session_dir: str, state: dict):
+    path = os.path.join(session_dir, "state.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def _load_session(cfg, user_id: int, upload_id: str):
+    session_dir = _session_dir(cfg, upload_id)
+    try:
+        with open(os.path.join(session_dir, "state.json"), encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        raise UploadNotFound("Unknown upload")
+    if state.get("user_id") != user_id:
+        raise UploadNotFound("Unknown upload")
+    return session_dir, state
+
+
+def _status(upload_id: str, session_dir: str, state: dict) -> dict:
+    files = {}
+    for kind, f in state["files"].items():
+        try:
+            received = os.path.getsize(_part_path(session_dir, kind))
+        except OSError:
+            received = f["size"] if state.get("recording_id") else 0
+        files[kind.lstrip(".")] = {"name": f["name"], "size": f["size"], "received": received}
+    return {
+        "upload_id": upload_id,
+        "files": files,
+        "complete": all(f["received"] == f["size"] for f in files.values()),
+        "recording_id": state.get("recording_id"),
+    }
+
+
+def _kind(kind: str) -> str:
+    kind = "." + (kind or "").lstrip(".").lower()
+    if kind not in UPLOAD_KINDS:
+        raise ValueError("kind must be dat or hea")
+    return kind
+
+
+def cleanup_stale_uploads(cfg):
+    """Removes upload sessions untouched for UPLOAD_SESSION_TTL_HOURS."""
+    root = cfg["UPLOAD_INCOMING_DIR"]
+    cutoff = time.time() - cfg.get("UPLOAD_SESSION_TTL_HOURS", 24) * 3600
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(root, name)
+        try:
+            touched = max(os.path.getmtime(os.path.join(path, f)) for f in os.listdir(path))
+        except (OSError, ValueError):
+            continue
+        if touched < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            _forget_hashers(name)
+
+
+def start_upload_session(cfg, user_id: int, files: dict) -> dict:
+    """
+    files: {"dat": {"name", "size", "sha256" (optional)}, "hea": {...}}.
+    Sizes are checked against UPLOAD_MAX_MB before a single byte is sent.
+    """
+    if not get_patient_by_user_id(cfg, user_id):
+        raise RuntimeError("No patient linked to this user_id")
+
+    max_bytes = _max_upload_bytes(cfg)
+    declared = {}
+    for kind in UPLOAD_KINDS:
+        f = files.get(kind.lstrip(".")) or {}
+        name = str(f.get("name") or "")
+        if not name.lower().endswith(kind):
+            raise ValueError(f"Invalid file type for {kind} file")
+        try:
+            size = int(f.get("size"))
+        except (TypeError, ValueError):
+            raise ValueError(f"Missing size for {kind} file")
+        if not 0 < size <= max_bytes:
+            raise ValueError(f"{kind} file must be between 1 byte and {max_bytes // (1024 * 1024)} MB")
+        sha256 = (f.get("sha256") or "").lower() or None
+        if sha256 and not re.fullmatch(r"[0-9a-f]{64}", sha256):
+            raise ValueError(f"Invalid sha256 for {kind} file")
+        declared[kind] = {"name": name, "size": size, "sha256": sha256}
+
+    record_name = _record_name(declared[".dat"]["name"], declared[".hea"]["name"])
+
+    cleanup_stale_uploads(cfg)
+
+    upload_id = uuid.uuid4().hex
+    session_dir = _session_dir(cfg, upload_id)
+    os.makedirs(session_dir)
+    for kind in UPLOAD_KINDS:
+        open(_part_path(session_dir, kind), "wb").close()
+
+    state = {
+        "user_id": user_id,
+        "record_name": record_name,
+        "created_at": time.time(),
+        "files": declared,
+    }
+    _write_state(session_dir, state)
+    return get_upload_status(cfg, user_id, upload_id)
+
+
+def get_upload_status(cfg, user_id: int, upload_id: str) -> dict:
+    """Bytes received per file, i.e. where the client continues after an interruption."""
+    session_dir, state = _load_session(cfg, user_id, upload_id)
+    return dict(_status(upload_id, session_dir, state), chunk_size=cfg.get("UPLOAD_CHUNK_BYTES", 8 * 1024 * 1024))
+
+
+def _hasher_at(upload_id: str, kind: str, fh, offset: int):
+    """
+    sha256 of the first `offset` bytes of fh, reusing the running hasher when possible.
+    Returns a copy: the cached one is only replaced after a chunk was written.
+
+    The cached hasher is only reused while the file is exactly the one it was
+    built from (inode, size, mtime); a file rewritten by another process, even
+    back to the same size, is hashed again from disk.
+    """
+    with _hashers_lock:
+        entry = _hashers.get((upload_id, kind))
+    if entry and entry[0] == _file_identity(fh) and entry[0][1] == offset:
+        return entry[1].copy()
+
+    h = hashlib.sha256()
+    fh.seek(0)
+    remaining = offset
+    while remaining:
+        buf = fh.read(min(1 << 20, remaining))
+        if not buf:
+            break
+        h.update(buf)
+        remaining -= len(buf)
+    return h
+
+
+def _file_identity(fh) -> tuple:
+    st = os.fstat(fh.fileno())
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _forget_hashers(upload_id: str):
+    with _hashers_lock:
+        for kind in UPLOAD_KINDS:
+            _hashers.pop((upload_id, kind), None)
+
+
+def write_upload_chunk(cfg, user_id: int, upload_id: str, kind: str, offset: int, stream, length: int | None) -> dict:
+    """
+    Appends one chunk (at most UPLOAD_CHUNK_BYTES) at `offset`, which must equal
+    the bytes received so far (UploadOffsetMismatch otherwise). The body is
+    streamed to disk and into the running checksum in small blocks.
+    """
+    kind = _kind(kind)
+    session_dir, state = _load_session(cfg, user_id, upload_id)
+    if state.get("recording_id"):
+        raise ValueError("Upload already completed")
+
+    chunk_size = cfg.get("UPLOAD_CHUNK_BYTES", 8 * 1024 * 1024)
+    if length is None or not 0 < length <= chunk_size:
+        raise ValueError(f"Each chunk needs a Content-Length of 1..{chunk_size} bytes")
+
+    size = state["files"][kind]["size"]
+    with open(_part_path(session_dir, kind), "r+b") as fh:
+        # One writer per file, across threads and processes
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            received = os.fstat(fh.fileno()).st_size
+            if offset != received:
+                raise UploadOffsetMismatch(received)
+            if received + length > size:
+                raise ValueError(f"Chunk goes past the declared size ({size} bytes)")
+
+            h = _hasher_at(upload_id, kind, fh, received)
+            release_pinned_connection()
+            fh.seek(received)
+            remaining = length
+            try:
+                while remaining:
+                    buf = stream.read(min(_STREAM_BLOCK, remaining))
+                    if not buf:
+                        break  # client went away; it resumes from the new offset
+                    fh.write(buf)
+                    h.update(buf)
+                    remaining -= len(buf)
+                fh.flush()
+            except BaseException:
+                # Part of the chunk may be on disk: rebuild the hash from the file next time
+                with _hashers_lock:
+                    _hashers.pop((upload_id, kind), None)
+                raise
+            received += length - remaining
+
+            with _hashers_lock:
+                _hashers[(upload_id, kind)] = (_file_identity(fh), h)
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+    return _status(upload_id, session_dir, state)
+
+
+def complete_upload_session(cfg, user_id: int, upload_id: str) -> int:
+    """
+    Creates and queues the recording once both files are complete and their
+    checksums match. Calling it again returns the same recording_id.
+    """
+    session_dir, state = _load_session(cfg, user_id, upload_id)
+
+    with open(os.path.join(session_dir, "state.json"), "rb") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # Re-read under the lock: a concurrent complete may have finished
+            session_dir, state = _load_session(cfg, user_id, upload_id)
+            if state.get("recording_id"):
+                return state["recording_id"]
+
+            parts = {}
+            for kind, f in state["files"].items():
+                path = _part_path(session_dir, kind)
+                with open(path, "rb") as fh:
+                    received = os.fstat(fh.fileno()).st_size
+                    if received != f["size"]:
+                        raise ValueError(f"{kind} file incomplete: {received} of {f['size']} bytes")
+                    digest = _hasher_at(upload_id, kind, fh, received).hexdigest()
+                if f.get("sha256") and digest != f["sha256"]:
+                    # Corrupt transfer: start this file over
+                    open(path, "wb").close()
+                    _forget_hashers(upload_id)
+                    raise ValueError(f"Checksum mismatch for {kind} file, please upload it again")
+                parts[kind] = (path, digest)
+
+            patient = get_patient_by_user_id(cfg, user_id)
+            if not patient:
+                raise RuntimeError("No patient linked to this user_id")
+
+            recording_id = create_recording(cfg, patient_id=patient["patient_id"], uploaded_by=user_id)
+            try:
+                _register_raw(cfg, recording_id, state["record_name"], parts)
+            except Exception as e:
+                set_status(cfg, recording_id, "FAILED", error_message=str(e))
+                raise
+
+            state["recording_id"] = recording_id
+            _write_state(session_dir, state)
+            _forget_hashers(upload_id)
+            return recording_id
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# --------------------------
+# Bulk upload (many WFDB records in one request)
+# --------------------------
+
+def _archive_members(archive):
+    """
+    Yields (filename, stream) for every regular file in a .zip or .tar(.gz/.bz2/.xz).
+    Tar archives are read as a stream; zip needs the (spooled) upload to be seekable.
+    """
+    name = (archive.filename or "").lower()
+    if name.endswith(".zip"):
+        with zipfile.ZipFile(archive.stream) as zf:
+            for info in zf.infolist():
+                if not info.is_dir():
+                    with zf.open(info) as member:
+                        yield info.filename, member
+    elif name.endswith((".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")):
+        with tarfile.open(fileobj=archive.stream, mode="r|*") as tf:
+            for info in tf:
+                if info.isfile():
+                    yield info.name, tf.extractfile(info)
+    else:
+        raise ValueError("Archive must be .zip or .tar(.gz)")
+
+
+def handle_bulk_upload(cfg, user_id: int, archive=None, files=()) -> dict:
+    """
+    Many WFDB records in one request: an archive, or a multipart batch of
+    .dat/.hea files. Pairs are matched by file name.
+
+    Files are streamed (hashed, size-capped) into a staging dir. Then, in one
+    transaction, all ecg rows are written with one multi-row INSERT and all
+    ecg_signal rows with another. Records identical to an already processed
+    recording (one lookup for the whole batch) reuse its outputs and are DONE
+    right away, as single uploads are; the rest are queued.
+    Returns {"recording_ids": [...], "records": [...], "reused": [...], "skipped": [...]}.
+    """
+    patient = get_patient_by_user_id(cfg, user_id)
+    if not patient:
+        raise RuntimeError("No patient linked to this user_id")
+
+    max_file = _max_upload_bytes(cfg)
+    max_total = int(cfg.get("UPLOAD_BULK_MAX_MB", 4096) * 1024 * 1024)
+    max_records = cfg.get("UPLOAD_BULK_MAX_RECORDS", 200)
+
+    members = _archive_members(archive) if archive else ((f.filename, f.stream) for f in files)
+    # No pool slot held while the archive streams in
+    release_pinned_connection()
+
+    staging = os.path.join(cfg["UPLOAD_INCOMING_DIR"], f"bulk-{uuid.uuid4().hex}")
+    os.makedirs(staging)
+    created_dirs = []
+    linked_ids = []  # reused outputs linked under a new recording id
+    try:
+        received = {}   # record name -> {".dat": (path, sha256), ".hea": ...}
+        skipped = []
+        total = 0
+        for filename, stream in members:
+            base = os.path.basename((filename or "").replace("\\", "/"))
+            ext = os.path.splitext(base)[1].lower()
+            if ext not in UPLOAD_KINDS:
+                skipped.append({"file": base, "reason": "not a .dat/.hea file"})
+                continue
+
+            stem = _safe_stem(base)
+            if ext in received.get(stem, {}):
+                skipped.append({"file": base, "reason": "duplicate file name in batch"})
+                continue
+            if len(received) >= max_records and stem not in received:
+                raise ValueError(f"Too many records (max {max_records} per upload)")
+
+            path = os.path.join(staging, stem + ext)
+            digest = save_stream_hashed(stream, path, max_bytes=max_file)
+            total += os.path.getsize(path)
+            if total > max_total:
+                raise ValueError(f"Upload too large (max {max_total // (1024 * 1024)} MB)")
+            received.setdefault(stem, {})[ext] = (path, digest)
+
+        records = []
+        for stem, parts in sorted(received.items()):
+            if len(parts) == 2:
+                records.append((stem, parts))
+            else:
+                missing = next(k for k in UPLOAD_KINDS if k not in parts)
+                skipped.append({"file": stem, "reason": f"missing {missing} file"})
+        if not records:
+            raise ValueError("No complete .dat/.hea pairs in upload")
+
+        content_hashes = [_content_hash(parts) for _, parts in records]
+        dups = find_processed_duplicates(cfg, content_hashes, PIPELINE_VERSION)
+
+        # ecg + ecg_signal rows commit together: a recording is never left QUEUED
+        # without its raw row (unclaimable)
+        with transaction(cfg):
+            recording_ids = create_recordings_bulk(cfg, patient["patient_id"], user_id, content_hashes)
+
+            reused, signal_rows, feature_pairs = [], [], []
+            for recording_id, (stem, parts), content_hash in zip(recording_ids, records, content_hashes):
+                rec_dir = recording_raw_dir(cfg, recording_id)
+                created_dirs.append(rec_dir)
+                base_path = os.path.join(rec_dir, stem)
+                for ext, (path, digest) in parts.items():
+                    store_content(cfg, path, digest, base_path + ext)
+
+                # Same dedup as single uploads
+                dup = dups.get(content_hash)
+                if dup and _link_duplicate(cfg, dup, recording_id):
+                    linked_ids.append(recording_id)
+                    reused.append(recording_id)
+                    signal_rows += _reused_signal_rows(cfg, recording_id, base_path, dup)
+                    feature_pairs.append((dup["recording_id"], recording_id))
+                else:
+                    signal_rows.append((recording_id, "raw", base_path, None))
+
+            upsert_signal_paths(cfg, signal_rows)
+            copy_recording_features_many(cfg, feature_pairs)
+            set_status_many(cfg, reused, "DONE", pipeline_version=PIPELINE_VERSION)
+
+        # Committed: the rows now own these files
+        created_dirs, linked_ids = [], []
+        queued = len(recording_ids) - len(reused)
+
+    except Exception:
+        for rec_dir in created_dirs:
+            shutil.rmtree(rec_dir, ignore_errors=True)
+        for recording_id in linked_ids:
+            remove_recording_outputs(cfg, recording_id)
+        raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    # One wakeup per queued recording (up to one per idle worker)
+    if queued:
+        notify_workers(cfg, count=queued)
+    logging.info(
+        "Bulk upload: %d recordings queued, %d reused for patient_id=%s",
+        queued, len(reused), patient["patient_id"],
+    )
+
+    return {
+        "recording_ids": recording_ids,
+        "records": [stem for stem, _ in records],
+        "reused": reused,
+        "skipped": skipped,
+    }
@@ -0,0 +1,81 @@
+import os
+import numpy as np
+
+# Each pyramid level has FACTOR x fewer bins than the one below it
+FACTOR = 4
+# Stop building levels once a level would have fewer bins than this
+MIN_BINS = 256
+# Samples (of the source level) reduced per block; bounds memory for long recordings
+BLOCK_BINS = 1 << 16
+
+
+def level_path(out_dir: str, level: int) -> str:
+    return os.path.join(out_dir, f"level{level}.npy")
+
+
+def build_envelope_pyramid(filtered, out_dir: str, factor: int = FACTOR, min_bins: int = MIN_BINS) -> list[dict]:
+    """
+    Builds a min/max envelope pyramid of a (n_leads, n_samples) signal.
+
+    Level k reduces bins of factor**k samples to their (min, max) and is stored
+    as out_dir/level{k}.npy with shape (n_leads, n_bins, 2), float32.
+    Each level is computed block by block from the level below, so `filtered`
+    can be a memmap and memory stays bounded.
+
+    Returns [{"level": k, "bin_samples": factor**k, "n_bins": ...}, ...].
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    src = filtered
+    src_is_envelope = False
+    n = filtered.shape[-1]
+    n_leads = filtered.shape[0]
+    levels = []
+
+    level = 1
+    while True:
+        n_bins = -(-n // factor)  # ceil
+        if n_bins < min_bins:
+            break
+
+        path = level_path(out_dir, level)
+        if os.path.exists(path):
+            os.remove(path)  # may be hard-linked to another recording's pyramid (dedup)
+        dst = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(n_leads, n_bins, 2))
+
+        step = BLOCK_BINS * factor
+        for lo in range(0, n, step):
+            hi = min(n, lo + step)
+            if src_is_envelope:
+                blk_min = np.asarray(src[:, lo:hi, 0])
+                blk_max = np.asarray(src[:, lo:hi, 1])
+            else:
+                blk_min = blk_max = np.asarray(src[:, lo:hi])
+
+            starts = np.arange(0, hi - lo, factor)
+            out_lo = lo // factor
+            out_hi = out_lo + starts.size
+            dst[:, out_lo:out_hi, 0] = np.minimum.reduceat(blk_min, starts, axis=1)
+            dst[:, out_lo:out_hi, 1] = np.maximum.reduceat(blk_max, starts, axis=1)
+
+        dst.flush()
+        levels.append({"level": level, "bin_samples": factor ** level, "n_bins": n_bins})
+
+        src = dst
+        src_is_envelope = True
+        n = n_bins
+        level += 1
+
+    return levels
+
+
+def pick_level(levels: list[dict], window_samples: int, pixels: int):
+    """
+    Coarsest level that still gives at least one bin per pixel for the window.
+    None means: window is short enough to send the samples themselves.
+    """
+    best = None
+    for lv in levels:
+        if window_samples // lv["bin_samples"] >= pixels:
+            best = lv
+    return best
@@ -1,54 +1,106 @@
+from functools import lru_cache
+
 import numpy as np
 from scipy import signal
 
 
-def detect_sudden_hr_change(filtered, fs, min_hr_jump_bpm=30, window_beats=3):
-    """
-    Simple HR change detector:
-      1) Detect R-peaks (rough)
-      2) Compute RR intervals -> HR series
-      3) Flag sudden change if HR jumps by >= min_hr_jump_bpm over a short beat window
+@lru_cache(maxsize=16)
+def _qrs_bandpass_sos(fs):
+    # Bandpass around QRS energy (approx 5-15 Hz) to boost peaks
+    return signal.butter(2, [5, 15], btype="bandpass", fs=fs, output="sos")
 
-    Returns a dict like your placeholder.
-    """
 
+def qrs_energy(filtered, fs):
+    """
+    QRS enhancement along the sample axis (last axis), for 1 or many leads at once:
+    bandpass 5-15 Hz -> square -> moving average (~150 ms).
+    """
     x = np.asarray(filtered, dtype=float)
-    if fs <= 0:
-        raise ValueError("fs must be > 0")
-    if x.size < int(fs * 3):
-        return {
-            "sudden_hr_change": False,
-            "note": "signal too short for HR change detection",
-        }
-
-    # --- 1) R-peak detection (rough but works for many ECGs) ---
-    # Bandpass around QRS energy (approx 5-15 Hz) to boost peaks
-    b_bp, a_bp = signal.butter(2, [5, 15], btype="bandpass", fs=fs)
-    y = signal.filtfilt(b_bp, a_bp, x)
+    y = signal.sosfiltfilt(_qrs_bandpass_sos(float(fs)), x, axis=-1)
 
     # Square to emphasize peaks
     y2 = y ** 2
 
     # Moving average integration (~150 ms)
     win = max(1, int(0.15 * fs))
-    kernel = np.ones(win) / win
-    y_int = np.convolve(y2, kernel, mode="same")
+    kernel = (np.ones(win) / win).reshape((1,) * (y2.ndim - 1) + (win,))
+    return signal.oaconvolve(y2, kernel, mode="same", axes=-1)
+
+
+def r_peak_candidates(y_int, fs):
+    """
+    Local maxima of a (1D) QRS energy signal with the refractory period (~250 ms)
+    applied, but no height threshold yet; returns (indices, heights).
+    Keeping the ones >= r_peak_threshold() gives the same peaks as picking with
+    that threshold directly (a lower maximum never suppresses a higher one).
+    """
+    refractory = int(0.25 * fs)
+    peaks, _ = signal.find_peaks(y_int, distance=max(1, refractory))
+    return peaks, np.asarray(y_int)[peaks]
+
+
+def r_peak_threshold(y_int):
+    """Height threshold for R-peaks: 95th percentile of the QRS energy (adaptive-ish)."""
+    return np.percentile(y_int, 95)
+
+
+def merge_peak_chunks(chunks, fs):
+    """
+    Joins R-peaks found chunk by chunk (global sample indices, in order) and
+    re-applies the refractory period across chunk borders.
+    """
+    if not chunks:
+        return np.zeros(0, dtype=np.int64)
+    peaks = np.concatenate(chunks).astype(np.int64)
+    if peaks.size < 2:
+        return peaks
 
-    # Peak picking: enforce refractory period (~250 ms)
     refractory = int(0.25 * fs)
-    thresh = np.percentile(y_int, 95)  # adaptive-ish threshold
-    peaks, _ = signal.find_peaks(y_int, height=thresh, distance=refractory)
+    if not np.any(np.diff(peaks) < refractory):
+        return peaks
 
-    if len(peaks) < (window_beats + 2):
+    # Rare: a beat detected on both sides of a chunk border
+    keep = [0]
+    last = peaks[0]
+    for i in range(1, peaks.size):
+        if peaks[i] - last >= refractory:
+            keep.append(i)
+            last = peaks[i]
+    return peaks[keep]
+
+
+def sliding_mean(x, w):
+    """Mean of every length-w window of x (cumulative sums, no Python loop)."""
+    c = np.concatenate(([0.0], np.cumsum(x, dtype=float)))
+    return (c[w:] - c[:-w]) / w
+
+
+def hrv_features(peaks, fs, min_hr_jump_bpm=30, window_beats=3):
+    """
+    HR series + HRV metrics from R-peak indices, in one vectorized pass.
+
+    Returns a dict with
+      hr_bpm, hr_time_s      full HR series (ndarrays) and the time of each beat
+      sudden_hr_change       any jump >= min_hr_jump_bpm between the mean HR of
+                             two consecutive windows of `window_beats` beats
+      max_hr_jump_bpm        largest such jump, and max_hr_jump_time_s where it happened
+      mean/min/max_hr_bpm, sdnn_ms, rmssd_ms, pnn50
+    or only {"sudden_hr_change": False, "note": ...} if there are too few beats.
+    Scales to 100k-beat Holter recordings in milliseconds.
+    """
+    peaks = np.asarray(peaks)
+    if peaks.size < (window_beats + 2):
         return {
             "sudden_hr_change": False,
             "note": "too few R-peaks detected",
         }
 
-    # --- 2) RR -> HR(t) ---
+    # --- RR -> HR(t) ---
     rr_sec = np.diff(peaks) / fs
     # Basic sanity: ignore impossible RR
-    rr_sec = rr_sec[(rr_sec > 0.3) & (rr_sec < 2.0)]  # 30–200 bpm
+    valid = (rr_sec > 0.3) & (rr_sec < 2.0)  # 30–200 bpm
+    rr_sec = rr_sec[valid]
+    beat_time_s = peaks[1:][valid] / fs
 
     if rr_sec.size < (window_beats + 1):
         return {
@@ -58,24 +110,45 @@ def detect_sudden_hr_change(filtered, fs, min_hr_jump_bpm=30, window_beats=3):
 
     hr_bpm = 60.0 / rr_sec
 
-    # --- 3) Sudden HR change test ---
-    # Compare local average HR over last "window_beats" vs previous window
+    # --- sudden HR change: mean of window [i-w, i) vs the window before it ---
     w = window_beats
-    max_jump = 0.0
-    sudden = False
-
-    for i in range(2 * w, len(hr_bpm) + 1):
-        prev = np.mean(hr_bpm[i - 2*w : i - w])
-        curr = np.mean(hr_bpm[i - w : i])
-        jump = abs(curr - prev)
-        if jump > max_jump:
-            max_jump = jump
-        if jump >= min_hr_jump_bpm:
-            sudden = True
-            break
+    means = sliding_mean(hr_bpm, w)
+    jumps = np.abs(means[w:] - means[:-w])
+    if jumps.size:
+        at = int(np.argmax(jumps))
+        max_jump = float(jumps[at])
+        max_jump_time = float(beat_time_s[at + 2 * w - 1])
+    else:
+        max_jump = 0.0
+        max_jump_time = None
+
+    # --- HRV (time domain) ---
+    rr_ms = rr_sec * 1000.0
+    succ_diff_ms = np.diff(rr_ms)
 
     return {
-        "sudden_hr_change": sudden,
-        "max_hr_jump_bpm": float(max_jump),
-        "note": "simple R-peak/RR HR-jump detector",
+        "sudden_hr_change": bool(max_jump >= min_hr_jump_bpm),
+        "max_hr_jump_bpm": max_jump,
+        "max_hr_jump_time_s": max_jump_time,
+        "mean_hr_bpm": float(hr_bpm.mean()),
+        "min_hr_bpm": float(hr_bpm.min()),
+        "max_hr_bpm": float(hr_bpm.max()),
+        "sdnn_ms": float(rr_ms.std(ddof=1)) if rr_ms.size > 1 else 0.0,
+        "rmssd_ms": float(np.sqrt(np.mean(succ_diff_ms ** 2))) if succ_diff_ms.size else 0.0,
+        "pnn50": float(np.mean(np.abs(succ_diff_ms) > 50.0)) if succ_diff_ms.size else 0.0,
+        "n_beats": int(hr_bpm.size),
+        "hr_bpm": hr_bpm,
+        "hr_time_s": beat_time_s,
+        "note": "R-peak/RR HR-jump detector + time-domain HRV",
     }
+
+
+def feature_summary(features: dict) -> dict:
+    """hrv_features() without the per-beat series (JSON/DB friendly)."""
+    return {k: v for k, v in features.items() if k not in ("hr_bpm", "hr_time_s")}
+
+
+def signal_too_short(n_samples, fs):
+    if fs <= 0:
+        raise ValueError("fs must be > 0")
+    return n_samples < int(fs * 3)
@@ -1,13 +1,52 @@
+from functools import lru_cache
+
 from scipy import signal
 import numpy as np
 
 
-def filter_ecg(ecg, fs):
+class FilterBank:
     """
-    ECG filtering pipeline:
+    The ECG filter chain as ONE cascaded second-order-sections (SOS) matrix:
     1) High-pass filter to remove baseline wander
-    2) Notch filter at 50 Hz to remove powerline interference
+    2) Notch filter (50 or 60 Hz) to remove powerline interference
     3) Low-pass filter to reduce EMG / high-frequency noise
+
+    Designed once per parameter set (see get_filter_bank) and applied with a
+    single zero-phase pass. SOS form stays numerically stable at high fs,
+    where the (b, a) polynomials of a 4th-order 0.5 Hz high-pass do not.
+    """
+
+    def __init__(self, fs, notch_hz=50.0, highpass_hz=0.5, lowpass_hz=40.0, order=4, notch_q=30.0):
+        if fs <= 0:
+            raise ValueError("Sampling frequency fs must be > 0")
+
+        self.fs = float(fs)
+        self.notch_hz = notch_hz
+        self.highpass_hz = highpass_hz
+        self.lowpass_hz = lowpass_hz
+
+        sos_hp = signal.butter(N=order, Wn=highpass_hz, btype="highpass", fs=fs, output="sos")
+        b_notch, a_notch = signal.iirnotch(w0=notch_hz, Q=notch_q, fs=fs)
+        sos_notch = signal.tf2sos(b_notch, a_notch)
+        sos_lp = signal.butter(N=order, Wn=lowpass_hz, btype="lowpass", fs=fs, output="sos")
+
+        self.sos = np.vstack([sos_hp, sos_notch, sos_lp])
+
+    def apply(self, x, axis=-1):
+        """Zero-phase filtering (forward + backward) along `axis`."""
+        return signal.sosfiltfilt(self.sos, x, axis=axis)
+
+
+@lru_cache(maxsize=32)
+def get_filter_bank(fs, notch_hz=50.0, highpass_hz=0.5, lowpass_hz=40.0) -> FilterBank:
+    """Memoized FilterBank: the filter design only runs once per (fs, notch, cutoffs)."""
+    return FilterBank(fs, notch_hz=notch_hz, highpass_hz=highpass_hz, lowpass_hz=lowpass_hz)
+
+
+def filter_ecg(ecg, fs, notch_hz=50.0, highpass_hz=0.5, lowpass_hz=40.0):
+    """
+    ECG filtering pipeline (high-pass 0.5 Hz, notch 50/60 Hz, low-pass 40 Hz),
+    applied as one cascaded SOS filter in a single zero-phase pass.
     """
 
     if fs <= 0:
@@ -15,30 +54,5 @@ def filter_ecg(ecg, fs):
 
     ecg = np.asarray(ecg)
 
-    # 1) High-pass filter (baseline wander)
-    b_hp, a_hp = signal.butter(
-        N=4,
-        Wn=0.5,
-        btype="highpass",
-        fs=fs
-    )
-    ecg_hp = signal.filtfilt(b_hp, a_hp, ecg)
-
-    # 2) Notch filter (50 Hz powerline noise)
-    b_notch, a_notch = signal.iirnotch(
-        w0=50,
-        Q=30,
-        fs=fs
-    )
-    ecg_notch = signal.filtfilt(b_notch, a_notch, ecg_hp)
-
-    # 3) Low-pass filter (EMG / high-frequency noise)
-    b_lp, a_lp = signal.butter(
-        N=4,
-        Wn=40,
-        btype="lowpass",
-        fs=fs
-    )
-    ecg_filtered = signal.filtfilt(b_lp, a_lp, ecg_notch)
-
-    return ecg_filtered
+    bank = get_filter_bank(float(fs), float(notch_hz), float(highpass_hz), float(lowpass_hz))
+    return bank.apply(ecg)
@@ -1,13 +1,97 @@
+import threading
+
 import matplotlib
 matplotlib.use("Agg")
 
-import matplotlib.pyplot as plt
+from matplotlib import mlab
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
 
+DPI = 150
+
+# Listing previews: small, no axes (width x height in pixels at THUMB_DPI)
+THUMB_DPI = 100
+THUMB_SIZE_PX = (240, 72)
+
+# Fixed margins (inches) instead of tight_layout, which costs an extra draw per plot
+_MARGIN_LEFT_IN = 0.9
+_MARGIN_RIGHT_IN = 0.15
+_MARGIN_BOTTOM_IN = 0.55
+_MARGIN_TOP_IN = 0.35
+
+# One reusable figure per (thread, figsize); Agg canvases are not thread-safe
+_local = threading.local()
+
+
+def _figure(figsize, bare: bool = False):
+    """
+    Persistent Agg figure + axes for this thread and size.
+    Reused across jobs: only the axes content is cleared between renders.
+    bare=True: axes fill the whole figure, no axis lines/labels (thumbnails).
+    """
+    figures = getattr(_local, "figures", None)
+    if figures is None:
+        figures = _local.figures = {}
+
+    key = (figsize, bare)
+    if key not in figures:
+        fig = Figure(figsize=figsize, dpi=DPI)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        w, h = figsize
+        if bare:
+            fig.subplots_adjust(left=0, right=1, bottom=0, top=1)
+        else:
+            fig.subplots_adjust(
+                left=_MARGIN_LEFT_IN / w,
+                right=1 - _MARGIN_RIGHT_IN / w,
+                bottom=_MARGIN_BOTTOM_IN / h,
+                top=1 - _MARGIN_TOP_IN / h,
+            )
+        figures[key] = (fig, ax)
+
+    fig, ax = figures[key]
+    ax.cla()
+    if bare:
+        ax.set_axis_off()
+    return fig, ax
+
+
+def _axes_width_px(fig, ax) -> int:
+    return max(1, int(round(fig.get_figwidth() * DPI * ax.get_position().width)))
+
+
+def minmax_envelope(x0, dx, y, n_bins):
+    """
+    Reduces an evenly spaced series (x = x0 + i*dx) to `n_bins` (min, max) pairs.
+
+    Drawn as a line through min/max of every bin, this is visually identical to
+    plotting all samples when n_bins >= the axes width in pixels: each pixel
+    column still spans exactly the same vertical range.
+    Short series are returned unchanged.
+    """
+    y = np.asarray(y)
+    n = y.size
+    if n <= 2 * n_bins:
+        return x0 + np.arange(n) * dx, y
+
+    starts = np.linspace(0, n, n_bins + 1).astype(np.int64)[:-1]
+    y_min = np.minimum.reduceat(y, starts)
+    y_max = np.maximum.reduceat(y, starts)
+
+    xs = np.repeat(x0 + starts * dx, 2)
+    ys = np.empty(2 * n_bins, dtype=y.dtype)
+    ys[0::2] = y_min
+    ys[1::2] = y_max
+    return xs, ys
+
 
-def save_time_plot(path, raw, filtered, fs):
+def save_time_plot(path, raw, filtered, fs, title="ECG: Raw vs Filtered"):
     """
     Saves a time-domain plot comparing raw and filtered ECG.
+    Each series is reduced to a per-pixel min/max envelope before drawing,
+    so render time does not grow with the recording length.
     """
     if fs <= 0:
         raise ValueError("Sampling frequency fs must be > 0")
@@ -15,56 +99,89 @@ def save_time_plot(path, raw, filtered, fs):
     raw = np.asarray(raw)
     filtered = np.asarray(filtered)
 
-    t = np.arange(len(raw)) / fs
+    fig, ax = _figure((10, 4))
+    n_bins = _axes_width_px(fig, ax)
 
-    plt.figure(figsize=(10, 4))
-    plt.plot(t, raw, label="Raw", alpha=0.8)
-    plt.plot(t, filtered, label="Filtered", alpha=0.8)
+    ax.plot(*minmax_envelope(0.0, 1.0 / fs, raw, n_bins), label="Raw", alpha=0.8)
+    ax.plot(*minmax_envelope(0.0, 1.0 / fs, filtered, n_bins), label="Filtered", alpha=0.8)
 
-    plt.xlabel("Time [s]")
-    plt.ylabel("Amplitude")
-    plt.title("ECG: Raw vs Filtered")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(path, dpi=150)
-    plt.close()
+    ax.set_xlabel("Time [s]")
+    ax.set_ylabel("Amplitude")
+    ax.set_title(title)
+    ax.legend()
+    fig.savefig(path, dpi=DPI)
 
 
-def save_spectrum_plot(path, raw, filtered, fs):
+def magnitude_spectrum_db(x, fs):
+    """
+    (freqs, magnitude in dB), same as plt.magnitude_spectrum(x, Fs=fs, scale="dB").
+    Works on a single series or along the last axis of (n_leads, n_samples).
+    """
+    x = np.asarray(x, dtype=float)
+    if x.ndim == 1:
+        spec, freqs = mlab.magnitude_spectrum(x, Fs=fs)
+    else:
+        freqs = None
+        rows = []
+        for row in x:
+            spec, freqs = mlab.magnitude_spectrum(row, Fs=fs)
+            rows.append(spec)
+        spec = np.vstack(rows)
+    return freqs, 20.0 * np.log10(np.maximum(spec, np.finfo(float).tiny))
+
+
+def save_spectrum_plot(path, raw, filtered, fs, title="Spectrum: Raw vs Filtered ECG"):
     """
     Saves a frequency-domain magnitude spectrum plot
     showing BOTH raw and filtered ECG.
+    Same spectrum as plt.magnitude_spectrum(scale="dB"), envelope-reduced for drawing.
     """
     if fs <= 0:
         raise ValueError("Sampling frequency fs must be > 0")
 
-    raw = np.asarray(raw)
-    filtered = np.asarray(filtered)
+    freqs, raw_db = magnitude_spectrum_db(raw, fs)
+    _, filtered_db = magnitude_spectrum_db(filtered, fs)
+    save_spectrum_plot_db(path, freqs, raw_db, filtered_db, title=title)
+
+
+def save_spectrum_plot_db(path, freqs, raw_db, filtered_db, title="Spectrum: Raw vs Filtered ECG"):
+    """Spectrum plot from precomputed dB spectra (e.g. the pipeline's PSD stage)."""
+    freqs = np.asarray(freqs)
+
+    fig, ax = _figure((8, 4))
+    n_bins = _axes_width_px(fig, ax)
+    df = freqs[1] - freqs[0] if freqs.size > 1 else 0.0
+
+    for spec_db, label in ((raw_db, "Raw"), (filtered_db, "Filtered")):
+        ax.plot(*minmax_envelope(freqs[0], df, np.asarray(spec_db), n_bins), label=label, alpha=0.8)
+
+    ax.set_xlabel("Frequency [Hz]")
+    ax.set_ylabel("Magnitude [dB]")
+    ax.set_title(title)
+    ax.legend()
+    fig.savefig(path, dpi=DPI)
+
+
+def save_thumbnail(path, y, fs, webp_path=None) -> bool:
+    """
+    Small preview of one (filtered) lead, no axes or labels, for listings.
+    Also writes `webp_path` if given and Pillow supports WebP; returns whether it did.
+    """
+    if fs <= 0:
+        raise ValueError("Sampling frequency fs must be > 0")
+
+    w, h = THUMB_SIZE_PX
+    fig, ax = _figure((w / THUMB_DPI, h / THUMB_DPI), bare=True)
+
+    ax.plot(*minmax_envelope(0.0, 1.0 / fs, np.asarray(y), w), linewidth=0.8)
+    ax.margins(x=0, y=0.05)
+    fig.savefig(path, dpi=THUMB_DPI, format="png")
 
-    plt.figure(figsize=(8, 4))
-
-    # Raw spectrum
-    plt.magnitude_spectrum(
-        raw,
-        Fs=fs,
-        scale="dB",
-        label="Raw",
-        alpha=0.8,
-    )
-
-    # Filtered spectrum
-    plt.magnitude_spectrum(
-        filtered,
-        Fs=fs,
-        scale="dB",
-        label="Filtered",
-        alpha=0.8,
-    )
-
-    plt.xlabel("Frequency [Hz]")
-    plt.ylabel("Magnitude [dB]")
-    plt.title("Spectrum: Raw vs Filtered ECG")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(path, dpi=150)
-    plt.close()
+    if webp_path is None:
+        return False
+    try:
+        fig.savefig(webp_path, dpi=THUMB_DPI, format="webp")
+    except (ValueError, OSError):
+        # Pillow built without WebP
+        return False
+    return True
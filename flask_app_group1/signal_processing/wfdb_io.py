@@ -1,13 +1,11 @@
 import os
+import numpy as np
 import wfdb
 
 
-def load_from_raw_dir(raw_dir: str, record_name: str = "rec", channel: int = 0, sampfrom: int = 0, sampto: int | None = None):
+def load_leads_from_raw_dir(raw_dir: str, record_name: str = "rec", channels: list[int] | None = None, sampfrom: int = 0, sampto: int | None = None):
     """
-    Loads one ECG channel from a WFDB recording located in raw_dir.
-
-    Expects WFDB files like:
-      raw_dir/rec.dat, raw_dir/rec.hea, raw_dir/rec.atr (optional), etc.
+    Loads several (default: all) ECG leads from a WFDB recording in ONE read.
 
     Parameters
     ----------
@@ -15,8 +13,8 @@ def load_from_raw_dir(raw_dir: str, record_name: str = "rec", channel: int = 0,
         Directory containing the WFDB recording files.
     record_name : str
         Base name of the WFDB record (default: "rec").
-    channel : int
-        Channel index to load (default: 0).
+    channels : list[int] | None
+        Channel indices to load. If None, loads every lead.
     sampfrom : int
         Start sample index (default: 0).
     sampto : int | None
@@ -24,10 +22,12 @@ def load_from_raw_dir(raw_dir: str, record_name: str = "rec", channel: int = 0,
 
     Returns
     -------
-    ecg : ndarray
-        ECG signal (1D).
+    signals : ndarray
+        Lead-major 2D array, shape (n_leads, n_samples); filter along axis=-1.
     fs : float
         Sampling frequency.
+    lead_names : list[str]
+        Signal names from the header (e.g. ["I", "II", "V1", ...]).
     """
     base = os.path.join(raw_dir, record_name)
 
@@ -36,11 +36,68 @@ def load_from_raw_dir(raw_dir: str, record_name: str = "rec", channel: int = 0,
 
     signals, info = wfdb.rdsamp(
         base,
-        channels=[channel],
+        channels=channels,
         sampfrom=sampfrom,
         sampto=sampto,
     )
 
     fs = info["fs"]
-    ecg = signals[:, 0]
-    return ecg, fs
+    lead_names = list(info.get("sig_name") or [])
+    if len(lead_names) != signals.shape[1]:
+        lead_names = [f"lead{i}" for i in range(signals.shape[1])]
+
+    # rdsamp gives (n_samples, n_leads); samples contiguous per lead is what the filters want
+    return np.ascontiguousarray(signals.T), fs, lead_names
+
+
+def read_record_info(raw_dir: str, record_name: str = "rec"):
+    """
+    Reads only the WFDB header (no samples).
+
+    Returns
+    -------
+    fs : float
+        Sampling frequency.
+    n_samples : int
+        Samples per lead.
+    lead_names : list[str]
+        Signal names of ALL leads in the record.
+    """
+    base = os.path.join(raw_dir, record_name)
+
+    if not os.path.exists(base + ".hea"):
+        raise FileNotFoundError(f"WFDB header not found: {base}.hea")
+
+    header = wfdb.rdheader(base)
+    lead_names = list(header.sig_name or [])
+    if len(lead_names) != header.n_sig:
+        lead_names = [f"lead{i}" for i in range(header.n_sig)]
+    return float(header.fs), int(header.sig_len), lead_names
+
+
+def iter_lead_windows(raw_dir: str, record_name: str, n_samples: int, chunk_samples: int, overlap_samples: int = 0, channels: list[int] | None = None):
+    """
+    Reads a recording window by window (sampfrom/sampto), so memory is bounded
+    by the chunk size and not by the recording length.
+
+    Yields (start, stop, lo, signals):
+      [start, stop)  the chunk this window is responsible for
+      lo             first sample of `signals`; the window is the chunk plus
+                     `overlap_samples` on both sides (clipped at the ends), so
+                     filter edge transients fall outside [start, stop)
+      signals        shape (n_leads, hi - lo)
+    """
+    chunk_samples = max(1, int(chunk_samples))
+    for start in range(0, n_samples, chunk_samples):
+        stop = min(start + chunk_samples, n_samples)
+        lo = max(0, start - overlap_samples)
+        hi = min(n_samples, stop + overlap_samples)
+
+        signals, _, _ = load_leads_from_raw_dir(
+            raw_dir,
+            record_name=record_name,
+            channels=channels,
+            sampfrom=lo,
+            sampto=hi,
+        )
+        yield start, stop, lo, signals
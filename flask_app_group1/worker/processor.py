@@ -1,51 +1,77 @@
+import os
+import sys
 import time
+import signal
+import socket
 import logging
+import argparse
+import threading
+import multiprocessing
+from multiprocessing.connection import wait as wait_for_exit
+
 from config import Config
-from repositories.recording_repo import fetch_next_queued, set_status, upsert_signal_path
-from services.processing_service import process_recording
+from infrastructure.wakeup import open_wakeup_socket, close_wakeup_socket, wait_for_wakeup
+from repositories.db import pinned_connection
+from repositories.recording_repo import (
+    claim_next_jobs,
+    release_claims,
+    requeue_dead_worker_claims,
+    list_claiming_workers,
+    set_status,
+    complete_recording,
+)
+from repositories.migrations import migrate
+from services.processing_service import process_recording, PIPELINE_VERSION
 
-POLL_SECONDS = 2
+# Supervisor: children that die within this many seconds count as crash-looping
+QUICK_CRASH_SECONDS = 10
+RESTART_BACKOFF_MAX = 30
 
 
-def main():
-    logging.basicConfig(level=logging.INFO)
+def load_cfg() -> dict:
+    # Same settings as the Flask app (all UPPERCASE attributes on Config)
+    return {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+
+
+def worker_id(pid: int | None = None) -> str:
+    return f"{socket.gethostname()}:{pid or os.getpid()}"
 
-    import os, sys
-    logging.info("Worker started: cwd=%s python=%s", os.getcwd(), sys.executable)
 
-    cfg = {
-        "DB_HOST": Config.DB_HOST,
-        "DB_PORT": getattr(Config, "DB_PORT", 3306),  # <-- add this
-        "DB_USER": Config.DB_USER,
-        "DB_PASSWORD": Config.DB_PASSWORD,
-        "DB_NAME": Config.DB_NAME,
-        "RAW_DIR": Config.RAW_DIR,
-        "FILTERED_DIR": Config.FILTERED_DIR,
-        "PLOTS_DIR": Config.PLOTS_DIR,
-        "LOG_DIR": Config.LOG_DIR,
-    }
-
-    while True:
-        logging.info("Polling queue...")
-        job = fetch_next_queued(cfg)
-        if not job:
-            time.sleep(POLL_SECONDS)
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    return True
+
+
+def requeue_stale_claims(cfg):
+    """
+    At startup: recordings still PROCESSING under a worker process on this host
+    that no longer runs (killed, host rebooted) go back to the queue.
+    Claims of other hosts are left alone.
+    """
+    host = socket.gethostname()
+    for wid in list_claiming_workers(cfg, host):
+        try:
+            pid = int(wid.rsplit(":", 1)[1])
+        except (IndexError, ValueError):
             continue
+        if pid != os.getpid() and _pid_alive(pid):
+            continue
+        logging.info("Requeueing recordings claimed by dead worker %s", wid)
+        requeue_dead_worker_claims(cfg, wid, max_attempts=cfg.get("WORKER_MAX_ATTEMPTS", 3))
+
 
-        recording_id = job["recording_id"]
+def handle_job(cfg, recording_id: int):
+    # One pooled connection for all DB calls of this job
+    with pinned_connection(cfg):
         try:
-            set_status(cfg, recording_id, "PROCESSING", pipeline_version="v1")
             result = process_recording(cfg, recording_id)
 
-            upsert_signal_path(
-                cfg,
-                recording_id,
-                "filtered",
-                result["filtered_path"],
-                sample_rate=result["fs"],
-            )
-
-            set_status(cfg, recording_id, "DONE")
+            complete_recording(cfg, recording_id, result, pipeline_version=PIPELINE_VERSION)
             logging.info("Processed recording_id=%s", recording_id)
 
         except Exception as e:
@@ -53,5 +79,201 @@ def main():
             logging.exception("Failed processing recording_id=%s", recording_id)
 
 
+def _idle_wait(wakeup_sock, stop: threading.Event, seconds: float) -> bool:
+    """
+    Sleeps up to `seconds`, returns True as soon as an upload notification arrives.
+    Waits in <= 1 s slices so SIGTERM is noticed quickly.
+    """
+    deadline = time.monotonic() + seconds
+    while not stop.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        if wakeup_sock is None:
+            stop.wait(min(1.0, remaining))
+        elif wait_for_wakeup(wakeup_sock, min(1.0, remaining)):
+            return True
+    return False
+
+
+def run_worker(cfg, stop: threading.Event, wakeup_sock=None):
+    """
+    Claim -> process loop of ONE worker process.
+    Checks `stop` between recordings, so an in-flight recording is always finished.
+
+    When idle it waits for an upload notification on `wakeup_sock`; the DB is
+    only re-polled with exponential backoff (WORKER_POLL_MIN/MAX_SECONDS) as a
+    safety net, or as the only mechanism if the socket is unavailable.
+    """
+    me = worker_id()
+    batch_size = cfg.get("WORKER_BATCH_SIZE", 1)
+    poll_min = cfg.get("WORKER_POLL_MIN_SECONDS", 0.5)
+    poll_max = cfg.get("WORKER_POLL_MAX_SECONDS", 30.0)
+    logging.info(
+        "Worker %s ready (batch_size=%s, wakeup=%s)",
+        me, batch_size, "socket" if wakeup_sock is not None else "polling",
+    )
+
+    delay = poll_min
+    while not stop.is_set():
+        logging.debug("Polling queue...")
+        # Atomic claim: jobs come back already PROCESSING and stamped with our id
+        jobs = claim_next_jobs(cfg, me, batch_size=batch_size, pipeline_version=PIPELINE_VERSION)
+        if not jobs:
+            if _idle_wait(wakeup_sock, stop, delay):
+                delay = poll_min
+            else:
+                delay = min(delay * 2, poll_max)
+            continue
+
+        delay = poll_min
+
+        for i, job in enumerate(jobs):
+            if stop.is_set():
+                # Hand the rest of the batch back to the other workers
+                release_claims(cfg, [j["recording_id"] for j in jobs[i:]])
+                break
+            handle_job(cfg, job["recording_id"])
+
+    logging.info("Worker %s stopped", me)
+
+
+def _install_stop_handlers(stop: threading.Event):
+    def _handler(signum, frame):
+        logging.info("Worker %s got signal %s, finishing in-flight recording", worker_id(), signum)
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _handler)
+    signal.signal(signal.SIGINT, _handler)
+
+
+def _child_main(cfg, wakeup_sock):
+    stop = threading.Event()
+    _install_stop_handlers(stop)
+    run_worker(cfg, stop, wakeup_sock)
+
+
+# --------------------------
+# Supervisor (--workers N)
+# --------------------------
+
+def supervise(cfg, n_workers: int, wakeup_sock=None):
+    """
+    Forks `n_workers` worker processes and keeps them running.
+
+    - a child that dies is restarted (with backoff if it keeps crashing);
+      the recordings it had claimed are requeued
+    - SIGTERM/SIGINT is forwarded to all children, which finish their
+      in-flight recording before exiting
+    - all children share the (inherited) wakeup socket
+    """
+    ctx = multiprocessing.get_context("fork")
+    supervisor_pid = os.getpid()
+    stopping = threading.Event()
+
+    children = {}       # slot -> Process
+    started_at = {}     # slot -> monotonic start time
+    quick_crashes = {}  # slot -> consecutive quick crashes
+    restart_at = {}     # slot -> monotonic time for a delayed restart
+
+    def _start(slot):
+        p = ctx.Process(target=_child_main, args=(cfg, wakeup_sock), name=f"worker-{slot}")
+        p.start()
+        children[slot] = p
+        started_at[slot] = time.monotonic()
+        logging.info("Supervisor: started worker-%s pid=%s", slot, p.pid)
+
+    def _on_signal(signum, frame):
+        # Children inherit this handler until they install their own
+        if os.getpid() != supervisor_pid:
+            return
+        if not stopping.is_set():
+            logging.info("Supervisor: signal %s, stopping %d workers", signum, len(children))
+        stopping.set()
+        for p in children.values():
+            if p.is_alive():
+                os.kill(p.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+
+    for slot in range(n_workers):
+        _start(slot)
+
+    while children or restart_at:
+        wait_for_exit([p.sentinel for p in children.values()], timeout=1)
+
+        for slot, p in list(children.items()):
+            if p.is_alive():
+                continue
+            p.join()
+            del children[slot]
+
+            if p.exitcode != 0:
+                logging.error("Supervisor: worker-%s pid=%s died (exitcode=%s)", slot, p.pid, p.exitcode)
+                requeue_dead_worker_claims(
+                    cfg, worker_id(p.pid), max_attempts=cfg.get("WORKER_MAX_ATTEMPTS", 3)
+                )
+
+            if stopping.is_set():
+                continue
+
+            if time.monotonic() - started_at[slot] < QUICK_CRASH_SECONDS:
+                quick_crashes[slot] = quick_crashes.get(slot, 0) + 1
+            else:
+                quick_crashes[slot] = 0
+            delay = min(RESTART_BACKOFF_MAX, 2 ** quick_crashes[slot] - 1)
+            restart_at[slot] = time.monotonic() + delay
+            if delay:
+                logging.info("Supervisor: restarting worker-%s in %ss", slot, delay)
+
+        if stopping.is_set():
+            restart_at.clear()
+            continue
+
+        now = time.monotonic()
+        for slot, at in list(restart_at.items()):
+            if at <= now:
+                del restart_at[slot]
+                _start(slot)
+
+    logging.info("Supervisor: all workers stopped")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ECG processing worker")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (default: WORKER_PROCESSES, 1 = no supervisor)",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(processName)s: %(message)s",
+    )
+    logging.info("Worker started: cwd=%s python=%s", os.getcwd(), sys.executable)
+
+    cfg = load_cfg()
+    migrate(cfg)
+    # Claims left by a previous run (single worker or supervisor children)
+    requeue_stale_claims(cfg)
+
+    n_workers = args.workers or cfg.get("WORKER_PROCESSES", 1)
+    wakeup_sock = open_wakeup_socket(cfg)
+    try:
+        if n_workers > 1:
+            supervise(cfg, n_workers, wakeup_sock)
+            return
+
+        stop = threading.Event()
+        _install_stop_handlers(stop)
+        run_worker(cfg, stop, wakeup_sock)
+    finally:
+        close_wakeup_socket(cfg, wakeup_sock)
+
+
 if __name__ == "__main__":
     main()